@@ -1,4 +1,4 @@
-from flask import Flask, redirect, url_for, render_template, make_response, g, session, send_from_directory
+from flask import Flask, redirect, url_for, render_template, make_response, g, session, send_from_directory, abort
 from flask_cors import CORS
 from flask_migrate import Migrate
 import os
@@ -23,6 +23,18 @@ limiter = Limiter(key_func=get_remote_address)
 csrf = CSRFProtect()
 migrate = Migrate()
 
+def socketio_queue_options(app):
+    """Socket.IO options that share emitted events with other processes"""
+    url = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    channel = app.config.get('SOCKETIO_CHANNEL', 'streamtip')
+    if not url:
+        return {}
+    if url.startswith('sqlite:///'):
+        from .services.socket_bus import SQLiteManager
+        return {'client_manager': SQLiteManager(url, channel=channel)}
+    # redis://, amqp://, kafka:// and zmq+tcp:// are handled by Flask-SocketIO
+    return {'message_queue': url, 'channel': channel}
+
 def create_app(test_config=None):
     # Create and configure the app
     app = Flask(__name__, instance_relative_config=True, static_folder='../build', static_url_path='/')
@@ -46,23 +58,34 @@ def create_app(test_config=None):
     except OSError:
         pass
     
-    # Configure database with absolute path
-    db_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'instance', 'streamtip.sqlite')
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    # Configure database: DATABASE_URL (as in app/config.py), defaulting to the
+    # SQLite file in the instance folder; relative SQLite paths resolve there too
+    if not app.config.get('SQLALCHEMY_DATABASE_URI'):
+        db_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'instance', 'streamtip.sqlite')
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f'sqlite:///{db_path}')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Connection pool (ignored for in-memory SQLite) and SQLite connection pragmas
+    app.config['DATABASE_POOL_SIZE'] = int(os.environ.get('DATABASE_POOL_SIZE', 10))
+    app.config['DATABASE_MAX_OVERFLOW'] = int(os.environ.get('DATABASE_MAX_OVERFLOW', 20))
+    app.config['DATABASE_POOL_TIMEOUT'] = int(os.environ.get('DATABASE_POOL_TIMEOUT', 30))
+    app.config['DATABASE_POOL_RECYCLE'] = int(os.environ.get('DATABASE_POOL_RECYCLE', 1800))
+    app.config['DATABASE_POOL_PRE_PING'] = os.environ.get('DATABASE_POOL_PRE_PING', 'true').lower() == 'true'
+    app.config['SQLITE_WAL'] = os.environ.get('SQLITE_WAL', 'true').lower() == 'true'
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))
+    
+    from .database import engine_options, init_engine
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    
     # Configure session
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-for-development')
     app.config['SESSION_TYPE'] = 'filesystem'
     app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour
     
-    # Disable caching for all routes
-    @app.after_request
-    def add_header(response):
-        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '-1'
-        return response
+    # Choose Cache-Control per route and path (see CachePolicy)
+    from .cache_policy import CachePolicy
+    CachePolicy.init_app(app)
     
     # Configure logging
     logging.basicConfig(level=logging.INFO)
@@ -81,6 +104,73 @@ def create_app(test_config=None):
     app.config['MPESA_B2C_SHORTCODE'] = os.environ.get('MPESA_B2C_SHORTCODE', app.config['MPESA_SHORTCODE'])
     app.config['MPESA_ENVIRONMENT'] = os.environ.get('MPESA_ENVIRONMENT', 'sandbox')
     
+    # M-Pesa HTTP transport (pooled keep-alive connections shared across threads)
+    app.config['MPESA_HTTP_POOL_CONNECTIONS'] = int(os.environ.get('MPESA_HTTP_POOL_CONNECTIONS', 4))
+    app.config['MPESA_HTTP_POOL_MAXSIZE'] = int(os.environ.get('MPESA_HTTP_POOL_MAXSIZE', 20))
+    app.config['MPESA_HTTP_KEEP_ALIVE'] = os.environ.get('MPESA_HTTP_KEEP_ALIVE', 'true').lower() == 'true'
+    app.config['MPESA_HTTP_CONNECT_TIMEOUT'] = float(os.environ.get('MPESA_HTTP_CONNECT_TIMEOUT', 5))
+    app.config['MPESA_HTTP_READ_TIMEOUT'] = float(os.environ.get('MPESA_HTTP_READ_TIMEOUT', 30))
+    
+    # M-Pesa OAuth token cache ('memory' or 'file' to share one token across workers)
+    app.config['MPESA_TOKEN_STORE'] = os.environ.get('MPESA_TOKEN_STORE', 'memory')
+    app.config['MPESA_TOKEN_STORE_PATH'] = os.environ.get('MPESA_TOKEN_STORE_PATH', os.path.join(app.instance_path, 'mpesa_token.json'))
+    app.config['MPESA_TOKEN_REFRESH_AHEAD'] = int(os.environ.get('MPESA_TOKEN_REFRESH_AHEAD', 300))
+    
+    # STK push initiation: 'sync' runs inline, 'async' queues to a bounded worker pool,
+    # 'queue' persists a job for the `manage.py run-worker` process
+    app.config['MPESA_STK_MODE'] = os.environ.get('MPESA_STK_MODE', 'sync')
+    app.config['MPESA_STK_WORKERS'] = int(os.environ.get('MPESA_STK_WORKERS', 4))
+    app.config['MPESA_STK_QUEUE_SIZE'] = int(os.environ.get('MPESA_STK_QUEUE_SIZE', 100))
+    
+    # B2C payout dispatch: 'sync' runs inline, 'queue' persists a job for the worker
+    app.config['MPESA_B2C_MODE'] = os.environ.get('MPESA_B2C_MODE', 'sync')
+    
+    # Pending STK push reconciliation (batch size, per-transaction cooldown in seconds, queries/sec)
+    app.config['MPESA_RECONCILE_BATCH'] = int(os.environ.get('MPESA_RECONCILE_BATCH', 50))
+    app.config['MPESA_RECONCILE_COOLDOWN'] = int(os.environ.get('MPESA_RECONCILE_COOLDOWN', 30))
+    app.config['MPESA_RECONCILE_RATE'] = float(os.environ.get('MPESA_RECONCILE_RATE', 5))
+    
+    # Periodic maintenance (see services/scheduled_jobs.py): hours before a pending
+    # tip times out, days to keep STK callback inbox rows
+    app.config['STALE_TRANSACTION_HOURS'] = int(os.environ.get('STALE_TRANSACTION_HOURS', 1))
+    app.config['STK_CALLBACK_RETENTION_DAYS'] = int(os.environ.get('STK_CALLBACK_RETENTION_DAYS', 7))
+    
+    # Logged-in creator snapshot cache (seconds to live, max entries; TTL 0 disables)
+    app.config['CREATOR_CACHE_TTL'] = int(os.environ.get('CREATOR_CACHE_TTL', 60))
+    app.config['CREATOR_CACHE_SIZE'] = int(os.environ.get('CREATOR_CACHE_SIZE', 1024))
+    
+    # Rendered tip page cache (seconds to live, max entries; TTL 0 disables)
+    # and the public max-age sent to browsers and CDNs
+    app.config['TIP_PAGE_CACHE_TTL'] = int(os.environ.get('TIP_PAGE_CACHE_TTL', 300))
+    app.config['TIP_PAGE_CACHE_SIZE'] = int(os.environ.get('TIP_PAGE_CACHE_SIZE', 1024))
+    app.config['TIP_PAGE_MAX_AGE'] = int(os.environ.get('TIP_PAGE_MAX_AGE', 60))
+    
+    # HTTP caching: max-age for hashed build assets under the immutable prefixes,
+    # and for other static assets (0 revalidates every use)
+    app.config['CACHE_IMMUTABLE_MAX_AGE'] = int(os.environ.get('CACHE_IMMUTABLE_MAX_AGE', 31536000))
+    app.config['CACHE_ASSET_MAX_AGE'] = int(os.environ.get('CACHE_ASSET_MAX_AGE', 0))
+    app.config['CACHE_IMMUTABLE_PREFIXES'] = os.environ.get('CACHE_IMMUTABLE_PREFIXES', 'assets/').split(',')
+    
+    # Rebuild the static asset manifest when a file is missing (defaults to on in debug)
+    if 'ASSET_MANIFEST_RELOAD' in os.environ:
+        app.config['ASSET_MANIFEST_RELOAD'] = os.environ['ASSET_MANIFEST_RELOAD'].lower() == 'true'
+    
+    # Cross-process Socket.IO fan-out so tips reach overlays on any worker:
+    # redis://, amqp://, kafka:// or sqlite:///path for a single-host stand-in
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+    app.config['SOCKETIO_CHANNEL'] = os.environ.get('SOCKETIO_CHANNEL', 'streamtip')
+    
+    # Coalesce overlay events per room over this window into 'tips_batch' frames (0 disables)
+    app.config['SOCKETIO_BATCH_WINDOW_MS'] = int(os.environ.get('SOCKETIO_BATCH_WINDOW_MS', 0))
+    app.config['SOCKETIO_BATCH_MAX_EVENTS'] = int(os.environ.get('SOCKETIO_BATCH_MAX_EVENTS', 100))
+    app.config['OVERLAY_EVENT_HISTORY'] = int(os.environ.get('OVERLAY_EVENT_HISTORY', 200))
+    
+    # Overlay Server-Sent Events stream (seconds between heartbeats and between
+    # polls for other processes' events, events buffered per connection)
+    app.config['OVERLAY_SSE_HEARTBEAT'] = int(os.environ.get('OVERLAY_SSE_HEARTBEAT', 15))
+    app.config['OVERLAY_SSE_POLL_INTERVAL'] = float(os.environ.get('OVERLAY_SSE_POLL_INTERVAL', 1.0))
+    app.config['OVERLAY_SSE_QUEUE_SIZE'] = int(os.environ.get('OVERLAY_SSE_QUEUE_SIZE', 100))
+    
     # Set base URL for callbacks
     app.config['BASE_URL'] = os.environ.get('BASE_URL', 'http://localhost:5000')
     
@@ -101,9 +191,10 @@ def create_app(test_config=None):
     
     # Initialize extensions with app
     db.init_app(app)
+    init_engine(app, db)
     migrate.init_app(app, db)
     CORS(app)
-    socketio.init_app(app, cors_allowed_origins="*")
+    socketio.init_app(app, cors_allowed_origins="*", **socketio_queue_options(app))
     limiter.init_app(app)
     csrf.init_app(app)
     
@@ -111,6 +202,34 @@ def create_app(test_config=None):
     from .services.mpesa import MpesaClient
     app.mpesa = MpesaClient(app)
     
+    # Initialize STK push dispatch
+    from .services.stk_service import StkPushService
+    StkPushService.init_app(app)
+    
+    # Initialize the creator identity cache used by the request loader
+    from .services.creator_cache import CreatorCache
+    CreatorCache.init_app(app)
+    
+    # Initialize the rendered public page cache
+    from .services.page_cache import PageCache
+    PageCache.init_app(app)
+    
+    # Index the SPA build directory once instead of stat-ing it per request
+    from .asset_manifest import AssetManifest
+    AssetManifest.init_app(app)
+    
+    # Configure socket event batching
+    from .services.socket_manager import SocketManager
+    SocketManager.init_app(app)
+    
+    # Configure the overlay Server-Sent Events stream
+    from .services.event_stream import EventStream
+    EventStream.init_app(app)
+    
+    # Register outbound job handlers and periodic maintenance tasks
+    from .services import mpesa_jobs
+    from .services import scheduled_jobs
+    
     # Import models
     from .models.user import Creator
     
@@ -126,23 +245,6 @@ def create_app(test_config=None):
     app.register_blueprint(payments_bp)
     app.register_blueprint(withdrawals_bp)
     
-    # Root route that can redirect based on authentication
-    @app.before_request
-    def load_logged_in_user():
-        creator_id = session.get('creator_id')
-        if creator_id is None:
-            g.user = None
-            g.creator = None
-        else:
-            creator = Creator.query.get(creator_id)
-            if creator is None:
-                g.user = None
-                g.creator = None
-                session.clear()
-            else:
-                g.user = creator  # For backward compatibility
-                g.creator = creator
-    
     # Root route
     @app.route('/')
     def index():
@@ -173,9 +275,15 @@ def create_app(test_config=None):
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
     def serve(path):
-        if path != "" and os.path.exists(app.static_folder + '/' + path):
-            return send_from_directory(app.static_folder, path)
+        if path != "" and AssetManifest.get(path):
+            return AssetManifest.send(path)
+        elif os.path.splitext(path)[1]:
+            # A missing file, not a client-side route
+            abort(404)
         else:
-            return send_from_directory(app.static_folder, 'index.html')
+            return AssetManifest.send('index.html')
+    
+    # The static rule shadows the catch-all above, so it shares the same view
+    app.view_functions['static'] = lambda filename: serve(filename)
     
     return app 
\ No newline at end of file
@@ -0,0 +1,148 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+from flask import request, current_app
+from werkzeug.exceptions import NotFound
+from werkzeug.wsgi import wrap_file
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+import time
+
+# Precompressed siblings in order of preference
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+AssetFile = namedtuple('AssetFile', ['filename', 'size', 'etag'])
+Asset = namedtuple('Asset', ['path', 'mimetype', 'last_modified', 'file', 'variants'])
+
+def _hash_file(filename):
+    """Content hash of a file, used as its strong ETag"""
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class AssetManifest:
+    """
+    In-memory index of the SPA build directory
+
+    Built once at startup so serving an asset is a dict lookup instead of
+    filesystem stat calls per request. Each entry holds the file's size,
+    mtime, content hash and any precompressed .br/.gz variants. With
+    ASSET_MANIFEST_RELOAD enabled (the default in debug) the index is
+    rebuilt on a miss, at most once per second, to pick up new builds.
+    """
+
+    _assets = {}
+    _lock = threading.Lock()
+    _directory = None
+    _reload = False
+    _last_reload = 0.0
+
+    @classmethod
+    def init_app(cls, app):
+        """
+        Index the app's static folder
+
+        Args:
+            app: Flask application
+        """
+        cls._directory = app.static_folder
+        cls._reload = app.config.get('ASSET_MANIFEST_RELOAD', app.debug)
+        cls.reload()
+
+    @classmethod
+    def reload(cls):
+        """
+        Rebuild the manifest from the build directory
+
+        Returns:
+            int: Number of assets indexed
+        """
+        assets = {}
+        directory = cls._directory
+        if directory and os.path.isdir(directory):
+            for root, _, filenames in os.walk(directory):
+                names = set(filenames)
+                for name in filenames:
+                    if any(name.endswith(suffix) and name[:-len(suffix)] in names for _, suffix in PRECOMPRESSED):
+                        continue  # Indexed as a variant of its original
+
+                    filename = os.path.join(root, name)
+                    path = os.path.relpath(filename, directory).replace(os.sep, '/')
+                    stat = os.stat(filename)
+                    variants = {}
+                    for encoding, suffix in PRECOMPRESSED:
+                        if name + suffix in names:
+                            compressed = filename + suffix
+                            variants[encoding] = AssetFile(compressed, os.path.getsize(compressed), _hash_file(compressed))
+
+                    assets[path] = Asset(
+                        path=path,
+                        mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                        last_modified=datetime.fromtimestamp(int(stat.st_mtime), timezone.utc),
+                        file=AssetFile(filename, stat.st_size, _hash_file(filename)),
+                        variants=variants
+                    )
+
+        with cls._lock:
+            cls._assets = assets
+            cls._last_reload = time.monotonic()
+        logging.info(f"Indexed {len(assets)} static assets from {directory}")
+        return len(assets)
+
+    @classmethod
+    def get(cls, path):
+        """
+        Look up an asset by its path relative to the build directory
+
+        Returns:
+            Asset: The asset, or None if it is not in the build
+        """
+        asset = cls._assets.get(path)
+        if asset is None and cls._reload and time.monotonic() - cls._last_reload > 1:
+            cls.reload()
+            asset = cls._assets.get(path)
+        return asset
+
+    @classmethod
+    def send(cls, path):
+        """
+        Send an asset, preferring a precompressed variant the client accepts
+
+        Responses carry the content hash as a strong ETag and support
+        conditional and range requests.
+
+        Raises:
+            NotFound: If the asset is not in the build
+        """
+        asset = cls.get(path)
+        if asset is None:
+            raise NotFound()
+
+        accepted = request.accept_encodings
+        file, encoding = asset.file, None
+        for candidate, _ in PRECOMPRESSED:
+            if candidate in asset.variants and accepted[candidate]:
+                file, encoding = asset.variants[candidate], candidate
+                break
+
+        try:
+            data = wrap_file(request.environ, open(file.filename, 'rb'))
+        except FileNotFoundError:
+            # Removed since indexing; pick up the new build next time
+            if cls._reload:
+                cls.reload()
+            raise NotFound()
+
+        response = current_app.response_class(data, mimetype=asset.mimetype, direct_passthrough=True)
+        response.content_length = file.size
+        response.set_etag(file.etag)
+        response.last_modified = asset.last_modified
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        return response.make_conditional(request, accept_ranges=True, complete_length=file.size)
@@ -0,0 +1,80 @@
+from flask import request, g, session
+import re
+
+# Content-addressed build output, e.g. assets/index-BfQ3x1aZ.js
+HASHED_ASSET = re.compile(r'-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+
+# Blueprints whose responses are private or carry payment state
+NO_STORE_BLUEPRINTS = {'auth', 'dashboard', 'api', 'payments', 'withdrawals'}
+
+# Asset endpoints and the view argument holding the file path
+ASSET_ENDPOINTS = {'static': 'filename', 'serve': 'path'}
+
+NO_STORE = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
+
+class CachePolicy:
+    """
+    Chooses Cache-Control for responses whose view did not set one
+
+    - hashed build assets: public, long max-age, immutable
+    - other assets: public, revalidated with their ETag
+    - authenticated traffic and payment blueprints: no-store
+    - everything else: revalidated on every use, private if it read the session
+    """
+
+    immutable_max_age = 31536000
+    asset_max_age = 0
+    immutable_prefixes = ('assets/',)
+
+    @classmethod
+    def init_app(cls, app):
+        """
+        Configure policy from the app config and install the after_request hook
+
+        Args:
+            app: Flask application
+        """
+        cls.immutable_max_age = app.config.get('CACHE_IMMUTABLE_MAX_AGE', 31536000)
+        cls.asset_max_age = app.config.get('CACHE_ASSET_MAX_AGE', 0)
+        cls.immutable_prefixes = tuple(app.config.get('CACHE_IMMUTABLE_PREFIXES', ['assets/']))
+        app.after_request(cls.apply)
+
+    @classmethod
+    def is_immutable(cls, path):
+        """Check if an asset path names content-addressed build output"""
+        return path.startswith(cls.immutable_prefixes) and bool(HASHED_ASSET.search(path))
+
+    @classmethod
+    def apply(cls, response):
+        """Set Cache-Control on a response unless the view chose its own"""
+        endpoint = request.endpoint or ''
+        blueprint = endpoint.rpartition('.')[0]
+
+        # send_file always stamps no-cache, so assets (including Range
+        # responses) are decided here
+        if endpoint in ASSET_ENDPOINTS and response.status_code in (200, 206, 304):
+            path = (request.view_args or {}).get(ASSET_ENDPOINTS[endpoint]) or ''
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            if cls.is_immutable(path):
+                response.cache_control.max_age = cls.immutable_max_age
+                response.cache_control.immutable = True
+            else:
+                response.cache_control.max_age = cls.asset_max_age
+                response.cache_control.must_revalidate = True
+            return response
+
+        if 'Cache-Control' in response.headers:
+            return response
+
+        if blueprint in NO_STORE_BLUEPRINTS or getattr(g, 'creator', None):
+            response.headers['Cache-Control'] = NO_STORE
+            response.headers['Pragma'] = 'no-cache'
+            response.headers['Expires'] = '-1'
+            return response
+
+        # Pages that read the session may differ per visitor
+        if getattr(session, 'accessed', False):
+            response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
@@ -0,0 +1,72 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+import logging
+
+def _is_file_sqlite(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+def engine_options(config):
+    """
+    SQLAlchemy engine options for the configured database
+
+    Pooling options only apply to databases with a connection pool; an
+    in-memory SQLite database keeps SQLAlchemy's single-connection pool.
+
+    Args:
+        config: Flask app config
+
+    Returns:
+        dict: Options for SQLALCHEMY_ENGINE_OPTIONS
+    """
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and not _is_file_sqlite(url):
+        return {}
+
+    return {
+        'pool_size': config.get('DATABASE_POOL_SIZE', 10),
+        'max_overflow': config.get('DATABASE_MAX_OVERFLOW', 20),
+        'pool_timeout': config.get('DATABASE_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DATABASE_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DATABASE_POOL_PRE_PING', True)
+    }
+
+def sqlite_pragmas(config):
+    """PRAGMA statements run on every new SQLite connection"""
+    pragmas = {
+        # Readers no longer block the writer, so callbacks don't fail with "database is locked"
+        'journal_mode': 'WAL',
+        # Wait for the write lock instead of raising immediately
+        'busy_timeout': config.get('SQLITE_BUSY_TIMEOUT', 5000),
+        # Durable at each checkpoint rather than each commit; safe with WAL
+        'synchronous': 'NORMAL',
+        'mmap_size': config.get('SQLITE_MMAP_SIZE', 268435456),
+    }
+    if not config.get('SQLITE_WAL', True):
+        del pragmas['journal_mode']
+    return pragmas
+
+def init_engine(app, db):
+    """
+    Apply per-connection settings to the app's engine
+
+    Must be called after db.init_app.
+
+    Args:
+        app: Flask application
+        db: Flask-SQLAlchemy extension
+    """
+    if not _is_file_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+
+    pragmas = sqlite_pragmas(app.config)
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, 'connect', set_pragmas)
+    logging.info(f"SQLite pragmas: {pragmas}")
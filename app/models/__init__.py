@@ -2,6 +2,13 @@ from .user import Creator
 from .transaction import Transaction
 from .withdrawal import Withdrawal
 from .tip_link import TipLink
+from .outbound_job import OutboundJob
+from .b2c_callback import ParkedB2CCallback
+from .creator_balance import CreatorBalance
+from .tip_rollup import TipRollup
+from .overlay_event import OverlayEvent
+from .stk_callback import StkCallback
+from .scheduler_lease import SchedulerLease
 
 # Export all models
-__all__ = ['Creator', 'Transaction', 'Withdrawal', 'TipLink'] 
\ No newline at end of file
+__all__ = ['Creator', 'Transaction', 'Withdrawal', 'TipLink', 'OutboundJob', 'ParkedB2CCallback', 'CreatorBalance', 'TipRollup', 'OverlayEvent', 'StkCallback', 'SchedulerLease'] 
\ No newline at end of file
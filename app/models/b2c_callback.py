@@ -0,0 +1,31 @@
+from .. import db
+from datetime import datetime
+from sqlalchemy import Index
+import json
+
+class ParkedB2CCallback(db.Model):
+    """Model for B2C callbacks that arrived before their withdrawal was stamped"""
+    __tablename__ = 'parked_b2c_callback'
+
+    KIND_RESULT = 'result'
+    KIND_TIMEOUT = 'timeout'
+
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.String(50), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Indexes for performance
+    __table_args__ = (
+        Index('idx_parked_b2c_conversation', 'conversation_id'),
+        Index('idx_parked_b2c_created', 'created_at'),
+    )
+
+    @property
+    def result(self):
+        """Decoded callback Result body"""
+        return json.loads(self.payload or '{}')
+
+    def __repr__(self):
+        return f'<ParkedB2CCallback {self.id}: {self.kind} for {self.conversation_id}>'
@@ -0,0 +1,30 @@
+from .. import db
+from datetime import datetime
+
+class CreatorBalance(db.Model):
+    """Materialized per-creator balance maintained alongside tips and withdrawals"""
+    __tablename__ = 'creator_balance'
+
+    creator_id = db.Column(db.Integer, db.ForeignKey('creator.id'), primary_key=True)
+    completed_tips = db.Column(db.Float, nullable=False, default=0.0)
+    pending_withdrawals = db.Column(db.Float, nullable=False, default=0.0)
+    withdrawn = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def available(self):
+        """Balance that can still be withdrawn"""
+        return self.completed_tips - self.pending_withdrawals - self.withdrawn
+
+    def to_dict(self):
+        """Convert balance to dictionary for API responses"""
+        return {
+            'creator_id': self.creator_id,
+            'completed_tips': self.completed_tips,
+            'pending_withdrawals': self.pending_withdrawals,
+            'withdrawn': self.withdrawn,
+            'available': self.available
+        }
+
+    def __repr__(self):
+        return f'<CreatorBalance {self.creator_id}: {self.available} KES available>'
@@ -0,0 +1,47 @@
+from .. import db
+from datetime import datetime
+from sqlalchemy import Index
+import json
+
+class OutboundJob(db.Model):
+    """Model for queued outbound M-Pesa API calls"""
+    __tablename__ = 'outbound_job'
+
+    # Status Constants
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_DEAD = 'dead'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default=STATUS_QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(64), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    # Indexes for performance
+    __table_args__ = (
+        Index('idx_outbound_job_ready', 'status', 'available_at'),
+        Index('idx_outbound_job_kind', 'kind'),
+    )
+
+    @property
+    def data(self):
+        """Decoded job payload"""
+        return json.loads(self.payload or '{}')
+
+    @property
+    def is_dead(self):
+        """Check if job was dead-lettered"""
+        return self.status == self.STATUS_DEAD
+
+    def __repr__(self):
+        return f'<OutboundJob {self.id}: {self.kind} - {self.status}>'
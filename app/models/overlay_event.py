@@ -0,0 +1,28 @@
+from .. import db
+from datetime import datetime
+from sqlalchemy import Index
+import json
+
+class OverlayEvent(db.Model):
+    """Recent socket events per creator, kept so reconnecting overlays can replay a gap"""
+    __tablename__ = 'overlay_event'
+
+    # id doubles as the event's sequence number; it only ever increases
+    id = db.Column(db.Integer, primary_key=True)
+    creator_id = db.Column(db.Integer, db.ForeignKey('creator.id'), nullable=False)
+    event = db.Column(db.String(32), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Indexes for performance
+    __table_args__ = (
+        Index('idx_overlay_event_creator', 'creator_id', 'id'),
+    )
+
+    @property
+    def data(self):
+        """Decoded event payload"""
+        return json.loads(self.payload or '{}')
+
+    def __repr__(self):
+        return f'<OverlayEvent {self.id}: {self.event} for creator {self.creator_id}>'
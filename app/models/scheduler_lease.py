@@ -0,0 +1,16 @@
+from .. import db
+from datetime import datetime
+
+class SchedulerLease(db.Model):
+    """Model for the lease that lets one process at a time run a periodic task"""
+    __tablename__ = 'scheduler_lease'
+
+    name = db.Column(db.String(64), primary_key=True)
+    locked_by = db.Column(db.String(64), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_started_at = db.Column(db.DateTime, nullable=True)
+    last_finished_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.String(500), nullable=True)
+
+    def __repr__(self):
+        return f'<SchedulerLease {self.name}: {self.locked_by} until {self.locked_until}>'
@@ -0,0 +1,16 @@
+from .. import db
+from datetime import datetime
+
+class StkCallback(db.Model):
+    """Inbox of STK push callbacks already accepted, keyed by CheckoutRequestID"""
+    __tablename__ = 'stk_callback'
+
+    # The primary key is what makes retried callbacks a no-op insert
+    checkout_request_id = db.Column(db.String(50), primary_key=True)
+    result_code = db.Column(db.Integer)
+    result_desc = db.Column(db.String(255))
+    mpesa_receipt = db.Column(db.String(50))
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StkCallback {self.checkout_request_id}: {self.result_code}>'
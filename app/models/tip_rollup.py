@@ -0,0 +1,25 @@
+from .. import db
+
+class TipRollup(db.Model):
+    """Completed tip totals per creator per hour or day bucket"""
+    __tablename__ = 'tip_rollup'
+
+    GRANULARITY_HOUR = 'hour'
+    GRANULARITY_DAY = 'day'
+
+    creator_id = db.Column(db.Integer, db.ForeignKey('creator.id'), primary_key=True)
+    granularity = db.Column(db.String(10), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    tip_count = db.Column(db.Integer, nullable=False, default=0)
+    tip_amount = db.Column(db.Float, nullable=False, default=0.0)
+
+    def to_dict(self):
+        """Convert rollup bucket to dictionary for API responses"""
+        return {
+            'bucket_start': self.bucket_start.isoformat(),
+            'tip_count': self.tip_count,
+            'tip_amount': self.tip_amount
+        }
+
+    def __repr__(self):
+        return f'<TipRollup {self.creator_id} {self.granularity} {self.bucket_start}: {self.tip_count} tips>'
@@ -25,6 +25,7 @@ class Transaction(db.Model):
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
     withdrawn = db.Column(db.Boolean, default=False)
     withdrawal_id = db.Column(db.Integer, db.ForeignKey('withdrawal.id'), nullable=True)
+    status_checked_at = db.Column(db.DateTime, nullable=True)  # Last M-Pesa status query
     
     # Relationships
     creator = db.relationship('Creator', back_populates='transactions')
@@ -37,6 +38,12 @@ class Transaction(db.Model):
         Index('idx_transaction_created', 'created_at'),
         Index('idx_transaction_mpesa', 'mpesa_receipt'),
         Index('idx_transaction_mpesa_request', 'mpesa_request_id'),
+        # Covers per-creator status aggregates without touching the table
+        Index('idx_transaction_creator_status', 'creator_id', 'status', 'amount'),
+        # Keyset pagination of a creator's history, newest first
+        Index('idx_transaction_creator_created', 'creator_id', 'created_at', 'id'),
+        # Stale pending sweep: range scan of one status by age
+        Index('idx_transaction_status_created', 'status', 'created_at'),
     )
     
     @property
@@ -1,9 +1,23 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from .. import db
-from sqlalchemy import Index, select, func, text
+from sqlalchemy import Index, select, func, case, literal, union_all
+from collections import namedtuple
 import uuid
 
+class BalanceSnapshot(namedtuple('BalanceSnapshot', ['completed_tips', 'pending_tips', 'pending_withdrawals', 'withdrawn'])):
+    """A creator's balances as of one query"""
+    __slots__ = ()
+
+    @property
+    def available(self):
+        """Balance that can still be withdrawn"""
+        return self.completed_tips - self.pending_withdrawals - self.withdrawn
+
+    def to_dict(self):
+        """Convert balance to dictionary for API responses"""
+        return dict(self._asdict(), available=self.available)
+
 class Creator(db.Model):
     """Model for content creators who can receive tips"""
     __tablename__ = 'creator'  # Explicitly set table name
@@ -106,51 +120,68 @@ class Creator(db.Model):
         """Get display name or fallback to username"""
         return self.display_name or self.username
         
-    def get_balance_with_lock(self):
-        """Calculate balances with proper transaction isolation"""
-        with db.session.begin():
-            # Lock the relevant transactions using SELECT FOR UPDATE
-            stmt = text("""
-                SELECT COALESCE(SUM(amount), 0) as completed
-                FROM transaction 
-                WHERE creator_id = :creator_id 
-                AND status = 'completed' 
-                AND withdrawn = false 
-                FOR UPDATE
-            """)
-            completed_txns = db.session.execute(stmt, {'creator_id': self.id}).scalar() or 0
-            
-            stmt = text("""
-                SELECT COALESCE(SUM(amount), 0) as withdrawn
-                FROM withdrawal 
-                WHERE creator_id = :creator_id 
-                AND status = 'completed'
-                FOR UPDATE
-            """)
-            withdrawn_amount = db.session.execute(stmt, {'creator_id': self.id}).scalar() or 0
-            
-            stmt = text("""
-                SELECT COALESCE(SUM(amount), 0) as pending
-                FROM transaction 
-                WHERE creator_id = :creator_id 
-                AND status = 'pending'
-            """)
-            pending_amount = db.session.execute(stmt, {'creator_id': self.id}).scalar() or 0
-            
-            return {
-                'available': completed_txns - withdrawn_amount,
-                'pending': pending_amount
-            }
+    @staticmethod
+    def compute_balance(creator_id):
+        """
+        Compute a creator's balances from tips and withdrawals in one query
+        
+        Both tables are combined with UNION ALL and summed with conditional
+        aggregation, so every figure comes from a single round trip and a
+        single consistent read.
+        
+        Returns:
+            BalanceSnapshot: The creator's balances
+        """
+        from .transaction import Transaction
+        from .withdrawal import Withdrawal
+        
+        rows = union_all(
+            select(literal('tip').label('kind'), Transaction.status, Transaction.amount)
+                .where(Transaction.creator_id == creator_id),
+            select(literal('withdrawal').label('kind'), Withdrawal.status, Withdrawal.amount)
+                .where(Withdrawal.creator_id == creator_id)
+        ).subquery()
+        
+        def total(kind, status):
+            return func.coalesce(func.sum(case(
+                ((rows.c.kind == kind) & (rows.c.status == status), rows.c.amount),
+                else_=0
+            )), 0)
+        
+        row = db.session.execute(select(
+            total('tip', 'completed'),
+            total('tip', 'pending'),
+            total('withdrawal', 'pending'),
+            total('withdrawal', 'completed')
+        )).one()
+        return BalanceSnapshot(*(float(value) for value in row))
+    
+    @property
+    def balance(self):
+        """
+        Balance snapshot, computed once per instance
+        
+        Call refresh_balance() after changing tips or withdrawals to
+        recompute it.
+        """
+        snapshot = self.__dict__.get('_balance_snapshot')
+        if snapshot is None:
+            snapshot = self.__dict__['_balance_snapshot'] = Creator.compute_balance(self.id)
+        return snapshot
+    
+    def refresh_balance(self):
+        """Drop the cached balance snapshot"""
+        self.__dict__.pop('_balance_snapshot', None)
     
     @property
     def available_balance(self):
-        """Calculate available balance with transaction isolation"""
-        return self.get_balance_with_lock()['available']
+        """Balance that can still be withdrawn"""
+        return self.balance.available
         
     @property
     def pending_balance(self):
-        """Calculate pending balance with transaction isolation"""
-        return self.get_balance_with_lock()['pending']
+        """Tips still awaiting M-Pesa confirmation"""
+        return self.balance.pending_tips
 
     def __repr__(self):
         return f'<Creator {self.username}>' 
\ No newline at end of file
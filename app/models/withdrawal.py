@@ -11,7 +11,10 @@ class Withdrawal(db.Model):
         Index('idx_withdrawal_status', 'status'),
         Index('idx_withdrawal_created', 'created_at'),
         Index('idx_withdrawal_mpesa_request', 'mpesa_request_id'),
+        # Keyset pagination of a creator's history, newest first
+        Index('idx_withdrawal_creator_created', 'creator_id', 'created_at', 'id'),
         db.UniqueConstraint('mpesa_request_id', name='uq_withdrawal_mpesa_request_id'),
+        db.UniqueConstraint('originator_conversation_id', name='uq_withdrawal_originator_conversation_id'),
     )
     
     id = db.Column(db.Integer, primary_key=True)
@@ -21,6 +24,7 @@ class Withdrawal(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, completed, failed
     mpesa_receipt = db.Column(db.String(50), unique=True, nullable=True)
     mpesa_request_id = db.Column(db.String(50), nullable=True)  # For tracking B2C requests
+    originator_conversation_id = db.Column(db.String(64), nullable=True)  # Our ID, reused on every send
     failure_reason = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
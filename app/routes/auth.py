@@ -1,6 +1,7 @@
 from flask import Blueprint, flash, g, redirect, render_template, request, session, url_for
 from werkzeug.security import check_password_hash, generate_password_hash
 from ..models.user import Creator
+from ..services.creator_cache import CreatorCache
 from .. import db
 import time
 import logging
@@ -107,22 +108,29 @@ def login():
     
     return render_template('auth/login.html')
 
+# Endpoints that never read the logged-in creator. Public tip pages are
+# listed too: touching the session would add Vary: Cookie to them.
+ANONYMOUS_ENDPOINTS = {'static', 'serve', 'payments.overlay', 'payments.overlay_events', 'payments.tip_page', 'payments.tip_by_username'}
+
 @auth_bp.before_app_request
 def load_logged_in_user():
-    creator_id = session.get('creator_id')
+    """Load the logged-in creator's identity snapshot into g"""
+    g.user = None
+    g.creator = None
 
+    if request.endpoint in ANONYMOUS_ENDPOINTS:
+        return
+
+    creator_id = session.get('creator_id')
     if creator_id is None:
-        g.user = None
-        g.creator = None
+        return
+
+    creator = CreatorCache.get(creator_id)
+    if creator is None:
+        session.clear()
     else:
-        creator = Creator.query.get(creator_id)
-        if creator is None:
-            g.user = None
-            g.creator = None
-            session.clear()
-        else:
-            g.user = creator  # For backward compatibility
-            g.creator = creator
+        g.user = creator  # For backward compatibility
+        g.creator = creator
 
 @auth_bp.route('/logout')
 def logout():
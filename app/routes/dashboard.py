@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, g, redirect, url_for, jsonify, session, request
+from flask import Blueprint, render_template, g, redirect, url_for, jsonify, session, request, abort, current_app
 from ..models.user import Creator
 from ..models.transaction import Transaction
 from ..services.transaction_service import TransactionService
@@ -6,15 +6,19 @@ from ..utils import login_required
 from .. import db
 import logging
 from datetime import datetime, timedelta
-import qrcode
-import io
-import base64
 from ..models.withdrawal import Withdrawal
 from ..services.withdrawal_service import WithdrawalService
+from ..services.rollup_service import RollupService
+from ..services.qr_codes import render_qr_code, QR_FORMATS
+from ..services.socket_manager import SocketManager
+from ..models.tip_rollup import TipRollup
 
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
 api = Blueprint('api', __name__, url_prefix='/api')
 
+# Rows per page in the dashboard withdrawals table
+WITHDRAWALS_PAGE_SIZE = 10
+
 @dashboard_bp.route('/')
 @login_required
 def index():
@@ -38,15 +42,12 @@ def index():
     withdrawal_stats = WithdrawalService.get_withdrawal_stats(creator.id)
     logging.debug(f"Withdrawal stats: {withdrawal_stats}")
     
-    # Get recent withdrawals
-    withdrawals = WithdrawalService.get_withdrawals(creator.id, limit=10)
+    # Get the first page of withdrawals
+    withdrawals, withdrawals_cursor = WithdrawalService.get_withdrawal_page(creator.id, limit=WITHDRAWALS_PAGE_SIZE)
     logging.debug(f"Found {len(withdrawals)} withdrawals for creator {creator.id}")
     
-    # Calculate monthly stats
-    monthly_stats = {
-        'monthly_amount': 0,
-        'monthly_count': 0
-    }
+    # Calculate monthly stats from the daily rollups
+    monthly_stats = RollupService.monthly_stats(creator.id)
     
     # Calculate average tip amount
     average_amount = 0
@@ -69,6 +70,7 @@ def index():
                           average_amount=average_amount,
                           tip_link=tip_link,
                           withdrawals=withdrawals,
+                          next_cursor=withdrawals_cursor,
                           available_balance=withdrawal_stats['available_balance'],
                           pending_withdrawals=withdrawal_stats['pending_withdrawals'],
                           total_withdrawn=withdrawal_stats['total_withdrawn'])
@@ -80,11 +82,21 @@ def get_transactions():
     if not creator:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    # Get transactions using service    
-    transactions = TransactionService.get_recent_transactions(creator.id, limit=50)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 100))
     
-    # Convert to JSON response
-    return jsonify([{
+    # Get transactions using service    
+    try:
+        transactions, next_cursor = TransactionService.get_transaction_page(
+            creator.id,
+            limit=limit,
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Convert to JSON response; the body stays a plain list, so the
+    # next page is advertised in a header
+    response = jsonify([{
         'id': t.id,
         'amount': t.amount,
         'status': t.status,
@@ -92,6 +104,10 @@ def get_transactions():
         'message': t.message,
         'created_at': t.created_at.isoformat()
     } for t in transactions])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for("api.get_transactions", cursor=next_cursor, limit=limit)}>; rel="next"'
+    return response
 
 @api.route('/stats')
 @login_required
@@ -106,6 +122,60 @@ def get_stats():
     # Return JSON response
     return jsonify(stats)
 
+@api.route('/transactions/chart')
+@login_required
+def transaction_chart():
+    """Get completed tip totals per bucket for the dashboard chart"""
+    creator = g.creator or g.user
+    if not creator:
+        return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
+    
+    days = max(1, min(request.args.get('days', 7, type=int), 365))
+    
+    # Hourly buckets read better for a single day
+    if days == 1:
+        granularity, label_format = TipRollup.GRANULARITY_HOUR, '%H:%M'
+    else:
+        granularity, label_format = TipRollup.GRANULARITY_DAY, '%Y-%m-%d'
+    
+    now = datetime.utcnow()
+    start = now - timedelta(days=days) if days == 1 else now - timedelta(days=days - 1)
+    series = RollupService.time_series(creator.id, granularity, start, now)
+    
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'dates': [bucket.strftime(label_format) for bucket, _, _ in series],
+            'totals': [amount for _, _, amount in series],
+            'counts': [count for _, count, _ in series]
+        }
+    })
+
+@api.route('/overlay/qr.<fmt>')
+@login_required
+def overlay_qr(fmt):
+    """Get the creator's tip link QR code as a PNG or SVG image"""
+    creator = g.creator or g.user
+    if not creator:
+        return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
+    if fmt not in QR_FORMATS:
+        abort(404)
+    
+    box_size = max(1, min(request.args.get('size', 10, type=int), 40))
+    
+    if hasattr(creator, 'tip_link_id') and creator.tip_link_id:
+        tip_link = url_for('payments.tip_page', link_id=creator.tip_link_id, _external=True)
+    else:
+        tip_link = url_for('payments.tip_by_username', username=creator.username, _external=True)
+    
+    image, etag = render_qr_code(tip_link, fmt, box_size)
+    
+    response = current_app.response_class(image, mimetype=QR_FORMATS[fmt])
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @api.route('/overlay/info')
 @login_required
 def overlay_info():
@@ -120,27 +190,13 @@ def overlay_info():
     else:
         tip_link = url_for('payments.tip_by_username', username=creator.username, _external=True)
     
-    # Generate QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(tip_link)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert QR code to base64
-    buffer = io.BytesIO()
-    img.save(buffer)
-    qr_code_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    
     return jsonify({
         'status': 'success',
         'tipLink': tip_link,
-        'qrCodeUrl': f"data:image/png;base64,{qr_code_base64}"
+        'overlayUrl': url_for('payments.overlay', creator_id=creator.id,
+                              token=SocketManager.overlay_token(creator.id), _external=True),
+        'qrCodeUrl': url_for('api.overlay_qr', fmt='png'),
+        'qrCodeSvgUrl': url_for('api.overlay_qr', fmt='svg')
     }) 
     return jsonify(stats) 
 
@@ -148,5 +204,16 @@ def overlay_info():
 @login_required
 def get_withdrawals():
     """Get updated withdrawals table HTML"""
-    withdrawals = Withdrawal.query.filter_by(creator_id=g.creator.id).order_by(Withdrawal.created_at.desc()).all()
-    return render_template('dashboard/_withdrawals_table.html', withdrawals=withdrawals) 
\ No newline at end of file
+    cursor = request.args.get('cursor')
+    try:
+        withdrawals, next_cursor = WithdrawalService.get_withdrawal_page(
+            g.creator.id,
+            limit=WITHDRAWALS_PAGE_SIZE,
+            cursor=cursor
+        )
+    except ValueError:
+        abort(400)
+    
+    # Later pages only append rows to the table that is already rendered
+    template = 'dashboard/_withdrawal_rows.html' if cursor else 'dashboard/_withdrawals_table.html'
+    return render_template(template, withdrawals=withdrawals, next_cursor=next_cursor) 
\ No newline at end of file
@@ -6,6 +6,10 @@ from .. import db, socketio
 from ..models.user import Creator
 from ..services.transaction_service import TransactionService
 from ..services.socket_manager import SocketManager
+from ..services.stk_service import StkPushService
+from ..services.job_queue import JobQueue
+from ..services.page_cache import PageCache
+from ..services.event_stream import EventStream
 from ..models.transaction import Transaction
 from ..schemas import PaymentSchema
 from ..security import verify_mpesa_signature, sanitize_payment_data, SecurityError
@@ -27,21 +31,31 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _cached_tip_page(key: tuple, load_creator) -> Optional[Response]:
+    """Serve a tip page from the rendered-page cache, rendering it on a miss."""
+    page = PageCache.get(key)
+    if page is None:
+        creator: Optional[Creator] = load_creator()
+        if not creator:
+            return None
+        page = PageCache.put(key, creator.id, render_template('tip_page.html', creator=creator))
+    return PageCache.response(page)
+
 @payments_bp.route('/tip_page/<string:link_id>', methods=['GET'])
 def tip_page(link_id: str) -> Response | Tuple[Response, int]:
     """Display the tipping page for a creator by link ID."""
-    creator: Optional[Creator] = Creator.query.filter_by(tip_link_id=link_id).first()
-    if not creator:
+    response = _cached_tip_page(('tip_link', link_id), lambda: Creator.query.filter_by(tip_link_id=link_id).first())
+    if response is None:
         abort(404, description="Creator not found for this tip link.")
-    return render_template('tip_page.html', creator=creator)
+    return response
 
 @payments_bp.route('/tip/<string:username>', methods=['GET'])
 def tip_by_username(username: str) -> Response | Tuple[Response, int]:
     """Display the tipping page for a creator by username."""
-    creator: Optional[Creator] = Creator.query.filter_by(username=username).first()
-    if not creator:
+    response = _cached_tip_page(('username', username), lambda: Creator.query.filter_by(username=username).first())
+    if response is None:
         abort(404, description=f"Creator '{username}' not found.")
-    return render_template('tip_page.html', creator=creator)
+    return response
 
 @payments_bp.route('/overlay/<int:creator_id>', methods=['GET'])
 def overlay(creator_id: int) -> Response | Tuple[Response, int]:
@@ -49,6 +63,32 @@ def overlay(creator_id: int) -> Response | Tuple[Response, int]:
     creator: Optional[Creator] = Creator.query.get_or_404(creator_id)
     return render_template('overlay.html', creator=creator)
 
+@payments_bp.route('/overlay/<int:creator_id>/events', methods=['GET'])
+def overlay_events(creator_id: int) -> Response | Tuple[Response, int]:
+    """Stream a creator's tip events to an overlay as Server-Sent Events.
+
+    Requires the overlay token (or the creator's session). Reconnecting
+    clients send Last-Event-ID and first receive the events they missed.
+    """
+    Creator.query.get_or_404(creator_id)
+    if not SocketManager.can_replay(creator_id, request.args.get('token')):
+        return jsonify({'status': 'error', 'message': 'Overlay token required'}), 403
+
+    # Subscribe before reading history so nothing falls between the two
+    subscription = EventStream.subscribe(creator_id)
+    backlog, last_seq = [], 0
+    last_event_id = request.headers.get('Last-Event-ID')
+    if last_event_id and last_event_id.isdigit():
+        last_seq = int(last_event_id)
+        backlog, truncated = SocketManager.replay(creator_id, last_seq)
+        if truncated:
+            logging.info(f"Overlay for creator {creator_id} resumed past retained history at {last_seq}")
+
+    response = Response(EventStream.stream(subscription, backlog, last_seq), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Keep nginx from buffering the stream
+    return response
+
 @payments_bp.route('/initiate_tip', methods=['POST'])
 @limiter.limit("5 per minute")
 @csrf.exempt
@@ -113,68 +153,60 @@ def initiate_tip() -> Tuple[Response, int]:
     base_url = current_app.config.get('BASE_URL', request.host_url.rstrip('/'))
     callback_url = f"{base_url}/payments/callback"
 
-    try:
-        # Initiate M-Pesa payment
-        mpesa = current_app.mpesa # Get MpesaClient instance
-        response: Dict[str, Any] = mpesa.stk_push(
-            phone_number=phone_number,
-            amount=int(amount), # Ensure amount is integer for M-Pesa
-            callback_url=callback_url,
-            account_reference=f"TIP{transaction.id}",
-            transaction_desc=f"Tip for creator {transaction.creator_id}" # Use ID for consistency
-        )
+    # Hand the push to the durable job queue processed by `manage.py run-worker`
+    if current_app.config.get('MPESA_STK_MODE', 'sync') == 'queue':
+        JobQueue.enqueue('stk_push', {'transaction_id': transaction.id, 'callback_url': callback_url})
+        return jsonify({
+            'status': 'success',
+            'message': 'Payment request queued',
+            'transaction_id': transaction.id,
+            'status_token': SocketManager.status_token(transaction.id),
+            'queued': True
+        }), 202
+
+    # Hand the push to the worker pool so a slow M-Pesa response never pins this request
+    if StkPushService.is_async():
+        if not StkPushService.submit(transaction.id, callback_url):
+            TransactionService.update_transaction_status(transaction.id, Transaction.STATUS_FAILED)
+            return jsonify({'status': 'error', 'message': 'Payment service is busy, please try again shortly'}), 503
 
-        # Handle test mode response directly from MpesaClient
-        if response.get('test_mode'):
-            logging.info(f"M-Pesa Test Mode response for Tx ID {transaction.id}")
-            transaction = TransactionService.process_successful_payment(
-                transaction,
-                receipt_number=f'TEST-{transaction.id}',
-                phone_number=phone_number
-            )
-            return jsonify({
-                'status': 'success',
-                'message': 'Test payment successful',
-                'transaction_id': transaction.id,
-                'test_mode': True,
-                'mpesa_receipt': transaction.mpesa_receipt,
-                'amount': float(transaction.amount),
-                'phone_number': transaction.phone_number,
-                'timestamp': transaction.updated_at.strftime('%Y-%m-%d %H:%M:%S')
-            }), 200
+        return jsonify({
+            'status': 'success',
+            'message': 'Payment request queued',
+            'transaction_id': transaction.id,
+            'status_token': SocketManager.status_token(transaction.id),
+            'queued': True
+        }), 202
 
-        # Handle real M-Pesa response
-        checkout_request_id = response.get('CheckoutRequestID')
-        mpesa_response_code = response.get('ResponseCode') # Check M-Pesa specific response code
-
-        if mpesa_response_code == '0' and checkout_request_id:
-            logging.info(f"M-Pesa STK Push accepted for Tx ID {transaction.id}, CheckoutReqID: {checkout_request_id}")
-            TransactionService.update_transaction_status(
-                transaction.id,
-                Transaction.STATUS_PENDING,
-                mpesa_request_id=checkout_request_id
-            )
-            return jsonify({
-                'status': 'success',
-                'message': 'Payment initiated successfully',
-                'transaction_id': transaction.id,
-                'checkout_request_id': checkout_request_id
-            }), 200
-        else:
-            # M-Pesa rejected the request before STK Push
-            error_message = response.get('errorMessage', 'M-Pesa rejected the STK push request.')
-            logging.error(f"M-Pesa STK Push initiation failed for Tx ID {transaction.id}. Response: {response}")
-            TransactionService.update_transaction_status(transaction.id, Transaction.STATUS_FAILED)
-            return jsonify({
-                'status': 'error',
-                'message': error_message
-            }), 500 # Or 4xx depending on M-Pesa error meaning
+    # Initiate M-Pesa payment inline
+    outcome = StkPushService.initiate(transaction, callback_url)
+    transaction = outcome['transaction']
 
-    except Exception as e:
-        logging.error(f"Error initiating M-Pesa payment for Tx ID {transaction.id}: {e}", exc_info=True)
-        TransactionService.update_transaction_status(transaction.id, Transaction.STATUS_FAILED)
-        # Provide a more generic error message to the client
-        return jsonify({'status': 'error', 'message': 'Could not initiate payment with provider'}), 500
+    if outcome['result'] == 'completed':
+        return jsonify({
+            'status': 'success',
+            'message': 'Test payment successful',
+            'transaction_id': transaction.id,
+            'test_mode': True,
+            'mpesa_receipt': transaction.mpesa_receipt,
+            'amount': float(transaction.amount),
+            'phone_number': transaction.phone_number,
+            'timestamp': transaction.updated_at.strftime('%Y-%m-%d %H:%M:%S')
+        }), 200
+
+    if outcome['result'] == 'pending':
+        return jsonify({
+            'status': 'success',
+            'message': 'Payment initiated successfully',
+            'transaction_id': transaction.id,
+            'status_token': SocketManager.status_token(transaction.id),
+            'checkout_request_id': outcome['checkout_request_id']
+        }), 200
+
+    return jsonify({
+        'status': 'error',
+        'message': outcome['message']
+    }), 500 # Or 4xx depending on M-Pesa error meaning
 
 def _parse_mpesa_callback_data(data: Dict[str, Any]) -> Dict[str, Any]:
     """Safely parses the nested M-Pesa callback data."""
@@ -206,49 +238,24 @@ def mpesa_callback() -> Tuple[Response, int]:
         return jsonify({'ResultCode': 1, 'ResultDesc': 'Invalid request format'}), 415 # M-Pesa expects specific responses?
 
     data = request.json
-    logging.info(f"M-Pesa callback received: {json.dumps(data)}") # Log full callback
+    logging.debug(f"M-Pesa callback received: {json.dumps(data)}")
 
     parsed_data = _parse_mpesa_callback_data(data)
     checkout_request_id = parsed_data.get('checkout_request_id')
-    result_code = parsed_data.get('result_code')
-    result_desc = parsed_data.get('result_desc')
-    receipt = parsed_data.get('mpesa_receipt')
 
     if not checkout_request_id:
-        logging.error("Missing CheckoutRequestID in parsed M-Pesa callback data")
+        logging.error(f"Missing CheckoutRequestID in parsed M-Pesa callback data: {json.dumps(data)}")
         return jsonify({'ResultCode': 1, 'ResultDesc': 'Invalid callback data'}), 400
 
     try:
-        # Find transaction using the CheckoutRequestID
-        transaction = TransactionService.find_by_mpesa_request(checkout_request_id)
-        if not transaction:
-            logging.error(f"Transaction not found for CheckoutRequestID: {checkout_request_id}. Callback data: {data}")
-            # Don't reveal transaction not found to potential attackers
-            return jsonify({'ResultCode': 0, 'ResultDesc': 'Accepted'}), 200 # Acknowledge receipt even if Tx unknown?
-
-        # Only process if the transaction is currently pending
-        if transaction.status != Transaction.STATUS_PENDING:
-            logging.warning(f"Received callback for already processed Tx ID {transaction.id} (status: {transaction.status}). Ignoring.")
-            return jsonify({'ResultCode': 0, 'ResultDesc': 'Accepted'}), 200
-
-        # Process result based on M-Pesa ResultCode
-        if result_code == 0:  # Success
-            logging.info(f"M-Pesa callback success for Tx ID {transaction.id}. Receipt: {receipt}")
-            transaction = TransactionService.process_successful_payment(
-                transaction,
-                receipt_number=receipt,
-                phone_number=transaction.phone_number
-            )
-        else:
-            # Payment failed or cancelled by user, etc.
-            logging.warning(f"M-Pesa callback failure for Tx ID {transaction.id}. Code: {result_code}, Desc: {result_desc}")
-            # Map M-Pesa failure codes to your internal statuses if needed (e.g., timeout vs explicit failure)
-            transaction = TransactionService.process_failed_payment(
-                transaction,
-                reason=result_desc
-            )
-
-        # Acknowledge successful processing to M-Pesa
+        # Retried deliveries and unknown requests are acknowledged too, so as
+        # not to reveal which CheckoutRequestIDs exist
+        TransactionService.handle_stk_callback(
+            checkout_request_id,
+            parsed_data.get('result_code'),
+            result_desc=parsed_data.get('result_desc'),
+            mpesa_receipt=parsed_data.get('mpesa_receipt')
+        )
         return jsonify({'ResultCode': 0, 'ResultDesc': 'Accepted'}), 200
 
     except SQLAlchemyError as e:
@@ -264,7 +271,7 @@ def mpesa_callback() -> Tuple[Response, int]:
 @payments_bp.route('/check_status/<int:transaction_id>', methods=['GET'])
 # @login_required? Or should this be public?
 def check_status(transaction_id: int) -> Tuple[Response, int]:
-    """Check the status of a transaction, optionally querying M-Pesa if pending."""
+    """Check the status of a transaction from the database."""
     try:
         transaction: Optional[Transaction] = Transaction.query.get(transaction_id)
         if not transaction:
@@ -282,46 +289,8 @@ def check_status(transaction_id: int) -> Tuple[Response, int]:
                 'mpesa_receipt': receipt
             }), 200
 
-        # If pending, try querying M-Pesa (rate limit this?)
-        if current_status == Transaction.STATUS_PENDING and transaction.mpesa_request_id:
-            logging.info(f"Status check for pending Tx ID {transaction_id}, querying M-Pesa.")
-            try:
-                mpesa = current_app.mpesa
-                response = mpesa.query_transaction(transaction.mpesa_request_id)
-
-                # Process the query result
-                mpesa_result_code = response.get('ResultCode')
-                mpesa_result_desc = response.get('ResultDescription', '')
-
-                if mpesa_result_code == '0': # Transaction successful
-                    logging.info(f"M-Pesa query confirms success for Tx ID {transaction_id}. Response: {response}")
-                    # Receipt might be in response, double check M-Pesa docs for query response structure
-                    queried_receipt = response.get('MpesaReceiptNumber') # Example field name
-                    transaction = TransactionService.process_successful_payment(
-                        transaction,
-                        receipt_number=queried_receipt or transaction.mpesa_receipt,
-                        phone_number=transaction.phone_number
-                    )
-                    current_status = Transaction.STATUS_COMPLETED # Update status for current response
-                elif mpesa_result_code: # Any non-zero M-Pesa code indicates failure/issue
-                    logging.warning(f"M-Pesa query indicates failure/issue for Tx ID {transaction_id}. Code: {mpesa_result_code}, Desc: {mpesa_result_desc}")
-                    # Decide if this maps to 'failed' or 'timeout' or remains 'pending'
-                    # For now, map to failed
-                    transaction = TransactionService.process_failed_payment(
-                        transaction,
-                        reason=mpesa_result_desc
-                    )
-                    current_status = Transaction.STATUS_FAILED # Update status for current response
-                else:
-                    # M-Pesa query response format unexpected or indicates pending/unknown
-                    logging.warning(f"Unexpected M-Pesa query response for Tx ID {transaction_id}: {response}")
-                    # Keep status as pending
-
-            except Exception as e:
-                logging.error(f"Unexpected error querying M-Pesa status for Tx ID {transaction.id}: {e}", exc_info=True)
-                # Don't update transaction status on query error, return current pending status
-
-        # Return the potentially updated status with full transaction data
+        # Pending transactions are settled by the M-Pesa callback or the
+        # background StatusReconciler, so polling never calls M-Pesa directly
         return jsonify({
             'status': 'success',
             'transaction_status': current_status,
@@ -345,11 +314,18 @@ def get_transactions(creator_id):
     if g.creator.id != creator_id:
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
         
+    limit = max(1, min(request.args.get('limit', 50, type=int), 100))
+        
     try:
-        transactions = TransactionService.get_recent_transactions(creator_id, limit=50)
+        transactions, next_cursor = TransactionService.get_transaction_page(
+            creator_id,
+            limit=limit,
+            cursor=request.args.get('cursor')
+        )
         
         return jsonify({
             'status': 'success',
+            'next_cursor': next_cursor,
             'transactions': [{
                 'id': t.id,
                 'amount': t.amount,
@@ -360,6 +336,9 @@ def get_transactions(creator_id):
             } for t in transactions]
         }), 200
     
+    except ValueError as e:
+        # Malformed cursor
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         logging.error(f"Error getting transactions: {str(e)}")
         return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
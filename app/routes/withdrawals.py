@@ -1,14 +1,15 @@
 from flask import Blueprint, request, jsonify, g, current_app
 from .. import db, limiter
-from ..models.withdrawal import Withdrawal
+from ..models.b2c_callback import ParkedB2CCallback
 from ..services.withdrawal_service import WithdrawalService
+from ..services.job_queue import JobQueue
+from ..services.mpesa import PaymentOutcomeUnknown
 from ..extensions import csrf
 from functools import wraps
 import logging
 import json
 from datetime import datetime
 import re
-import time
 
 withdrawals_bp = Blueprint('withdrawals', __name__, url_prefix='/withdrawals')
 
@@ -44,75 +45,60 @@ def initiate_withdrawal():
         if not re.match(r'^254[0-9]{9}$', phone_number):
             return jsonify({'status': 'error', 'message': 'Invalid phone number format'}), 400
 
-        # Check available balance
-        available_balance = WithdrawalService.get_available_balance(g.creator.id)
-        if amount > available_balance:
-            return jsonify({'status': 'error', 'message': 'Insufficient balance'}), 400
-
-        # Create withdrawal record
-        withdrawal = Withdrawal(
-            creator_id=g.creator.id,
-            amount=amount,
-            phone_number=phone_number,
-            status='pending'
-        )
-        db.session.add(withdrawal)
-        db.session.commit()
+        # Reserve the amount and create the withdrawal record atomically
+        try:
+            withdrawal = WithdrawalService.create_withdrawal(g.creator.id, amount, phone_number)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
 
         # Log withdrawal creation
         logging.info(f"Created withdrawal {withdrawal.id} for creator {g.creator.id}")
         logging.info(f"Amount: {amount}, Phone: {phone_number}")
 
+        # Hand the payout to the job worker when queued dispatch is enabled
+        if current_app.config.get('MPESA_B2C_MODE', 'sync') == 'queue':
+            JobQueue.enqueue('b2c_payment', {'withdrawal_id': withdrawal.id})
+            return jsonify({
+                'status': 'success',
+                'message': 'Withdrawal queued successfully',
+                'withdrawal_id': withdrawal.id,
+                'queued': True
+            }), 202
+
         # Initiate M-Pesa B2C payment
         try:
-            response = current_app.mpesa.b2c_payment(
-                phone_number=phone_number,
-                amount=int(amount),
-                remarks=f"StreamTip withdrawal #{withdrawal.id}"
-            )
-
-            logging.info(f"M-Pesa B2C response: {json.dumps(response, indent=2)}")
-
-            if response.get('test_mode', False):
-                # Handle test mode response
-                receipt = f'TEST-{withdrawal.id}'
-                WithdrawalService.process_withdrawal(
-                    withdrawal.id,
-                    success=True,
-                    receipt=receipt,
-                    test_mode=True
-                )
+            outcome = WithdrawalService.send_payout(withdrawal)
 
+            if outcome['result'] == 'completed':
                 return jsonify({
                     'status': 'success',
                     'message': 'Test withdrawal completed successfully',
                     'withdrawal_id': withdrawal.id,
                     'test_mode': True,
-                    'receipt': receipt
+                    'receipt': outcome['receipt']
                 }), 200
 
-            elif 'ConversationID' in response:
-                # Store the conversation ID for callback matching
-                withdrawal.mpesa_request_id = response['ConversationID']
-                db.session.commit()
-
+            elif outcome['result'] == 'pending':
                 return jsonify({
                     'status': 'success',
                     'message': 'Withdrawal initiated successfully',
                     'withdrawal_id': withdrawal.id
                 }), 200
             else:
-                # Invalid response from M-Pesa
-                WithdrawalService.process_withdrawal(
-                    withdrawal.id,
-                    success=False,
-                    failure_reason='Invalid response from M-Pesa'
-                )
                 return jsonify({
                     'status': 'error',
                     'message': 'Failed to initiate withdrawal'
                 }), 500
 
+        except PaymentOutcomeUnknown as e:
+            # The payout may have gone through; the result callback settles it
+            logging.error(f"M-Pesa B2C outcome unknown for withdrawal {withdrawal.id}: {str(e)}")
+            return jsonify({
+                'status': 'success',
+                'message': 'Withdrawal submitted; awaiting confirmation from M-Pesa',
+                'withdrawal_id': withdrawal.id
+            }), 202
+
         except Exception as e:
             # Handle M-Pesa API errors
             WithdrawalService.process_withdrawal(
@@ -148,70 +134,24 @@ def b2c_result():
         # Extract relevant data
         result = data.get('Result', {})
         conversation_id = result.get('ConversationID')
-        result_code = result.get('ResultCode')
-        result_desc = result.get('ResultDesc')
 
         if not conversation_id:
             logging.error("B2C result callback missing ConversationID")
             return jsonify({'status': 'error', 'message': 'Invalid callback data'}), 400
 
-        # Find the withdrawal with retries
-        max_retries = 3
-        retry_delay = 1
-        withdrawal = None
-        last_error = None
-
-        for attempt in range(max_retries):
-            try:
-                withdrawal = Withdrawal.query.filter_by(mpesa_request_id=conversation_id).first()
-                if withdrawal:
-                    break
-                logging.warning(f"Withdrawal not found for conversation_id {conversation_id}, attempt {attempt + 1}/{max_retries}")
-                time.sleep(retry_delay)
-                retry_delay *= 2
-            except Exception as e:
-                last_error = e
-                logging.error(f"Database error on attempt {attempt + 1}: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                    continue
-                raise
-
-        if not withdrawal:
-            logging.error(f"Withdrawal not found after {max_retries} attempts for conversation_id {conversation_id}")
-            return jsonify({'status': 'error', 'message': 'Withdrawal not found'}), 404
-
-        # Extract transaction receipt if successful
-        receipt = None
-        if result_code == 0:  # Success
-            params = result.get('ResultParameters', {}).get('ResultParameter', [])
-            for param in params:
-                if param.get('Key') == 'TransactionReceipt':
-                    receipt = param.get('Value')
-                    break
-
         try:
-            # Process the result
-            if result_code == 0:  # Success
-                WithdrawalService.process_withdrawal(
-                    withdrawal.id,
-                    success=True,
-                    receipt=receipt
-                )
-                logging.info(f"Successfully processed withdrawal {withdrawal.id}")
-            else:
-                WithdrawalService.process_withdrawal(
-                    withdrawal.id,
-                    success=False,
-                    failure_reason=result_desc or 'Payment failed'
-                )
-                logging.error(f"Failed to process withdrawal {withdrawal.id}: {result_desc}")
-
+            # Apply now, or park until initiate_withdrawal stamps the ConversationID
+            outcome = WithdrawalService.handle_b2c_callback(
+                conversation_id,
+                ParkedB2CCallback.KIND_RESULT,
+                result
+            )
+            logging.debug(f"B2C result callback for {conversation_id}: {outcome}")
             return jsonify({'status': 'success'}), 200
 
         except Exception as e:
-            logging.error(f"Error processing withdrawal {withdrawal.id}: {str(e)}")
+            db.session.rollback()
+            logging.error(f"Error processing B2C result for conversation_id {conversation_id}: {str(e)}")
             # Don't expose internal errors to M-Pesa
             return jsonify({'status': 'error', 'message': 'Internal processing error'}), 500
 
@@ -242,46 +182,19 @@ def b2c_timeout():
             logging.error("B2C timeout callback missing ConversationID")
             return jsonify({'status': 'error', 'message': 'Invalid callback data'}), 400
             
-        # Find the withdrawal with retries
-        max_retries = 3
-        retry_delay = 1
-        withdrawal = None
-        last_error = None
-
-        for attempt in range(max_retries):
-            try:
-                withdrawal = Withdrawal.query.filter_by(mpesa_request_id=conversation_id).first()
-                if withdrawal:
-                    break
-                logging.warning(f"Withdrawal not found for conversation_id {conversation_id}, attempt {attempt + 1}/{max_retries}")
-                time.sleep(retry_delay)
-                retry_delay *= 2
-            except Exception as e:
-                last_error = e
-                logging.error(f"Database error on attempt {attempt + 1}: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                    continue
-                raise
-
-        if not withdrawal:
-            logging.error(f"Withdrawal not found after {max_retries} attempts for conversation_id {conversation_id}")
-            return jsonify({'status': 'error', 'message': 'Withdrawal not found'}), 404
-            
         try:
-            # Mark as failed due to timeout
-            WithdrawalService.process_withdrawal(
-                withdrawal.id,
-                success=False,
-                failure_reason='Transaction timed out'
+            # Apply now, or park until initiate_withdrawal stamps the ConversationID
+            outcome = WithdrawalService.handle_b2c_callback(
+                conversation_id,
+                ParkedB2CCallback.KIND_TIMEOUT,
+                result
             )
-            logging.info(f"Marked withdrawal {withdrawal.id} as failed due to timeout")
-            
+            logging.debug(f"B2C timeout callback for {conversation_id}: {outcome}")
             return jsonify({'status': 'success'}), 200
             
         except Exception as e:
-            logging.error(f"Error processing withdrawal timeout {withdrawal.id}: {str(e)}")
+            db.session.rollback()
+            logging.error(f"Error processing withdrawal timeout for conversation_id {conversation_id}: {str(e)}")
             # Don't expose internal errors to M-Pesa
             return jsonify({'status': 'error', 'message': 'Internal processing error'}), 500
             
@@ -299,11 +212,18 @@ def get_withdrawals(creator_id):
     if g.creator.id != creator_id:
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
         
+    limit = max(1, min(request.args.get('limit', 50, type=int), 100))
+        
     try:
-        withdrawals = WithdrawalService.get_withdrawals(creator_id)
+        withdrawals, next_cursor = WithdrawalService.get_withdrawal_page(
+            creator_id,
+            limit=limit,
+            cursor=request.args.get('cursor')
+        )
         
         return jsonify({
             'status': 'success',
+            'next_cursor': next_cursor,
             'withdrawals': [{
                 'id': w.id,
                 'amount': float(w.amount),
@@ -315,6 +235,9 @@ def get_withdrawals(creator_id):
             } for w in withdrawals]
         }), 200
         
+    except ValueError as e:
+        # Malformed cursor
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         logging.error(f"Error getting withdrawals: {str(e)}")
         return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
@@ -0,0 +1,202 @@
+from .. import db
+from ..models.creator_balance import CreatorBalance
+from ..models.transaction import Transaction
+from ..models.withdrawal import Withdrawal
+from ..models.user import Creator
+from .db_utils import insert_ignore
+from datetime import datetime
+from sqlalchemy import update
+import logging
+
+# Which ledger column each status contributes to
+TRANSACTION_COLUMNS = {
+    Transaction.STATUS_COMPLETED: 'completed_tips',
+}
+
+WITHDRAWAL_COLUMNS = {
+    'pending': 'pending_withdrawals',
+    'completed': 'withdrawn',
+}
+
+class BalanceLedger:
+    """
+    Incrementally maintained per-creator balances
+
+    Adjustments are issued as relative UPDATEs inside the caller's database
+    transaction, so they commit or roll back together with the status change
+    that caused them. Nothing here commits except rebuild.
+    """
+
+    @staticmethod
+    def _ensure(creator_id):
+        """
+        Create a creator's missing ledger row from source rows
+
+        Uses insert-or-ignore, so concurrent first writers for a creator
+        never collide, and does not commit.
+
+        Returns:
+            bool: True if this call created the row
+        """
+        return insert_ignore(CreatorBalance, {
+            'creator_id': creator_id,
+            **BalanceLedger.compute(creator_id),
+            'updated_at': datetime.utcnow()
+        }, index_elements=['creator_id'])
+
+    @staticmethod
+    def _adjust(creator_id, **deltas):
+        """Add deltas to a creator's ledger row, creating it if needed"""
+        deltas = {column: delta for column, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        if BalanceLedger._ensure(creator_id):
+            # The seed was computed after the caller's change was flushed, so it already counts it
+            return
+
+        values = {column: getattr(CreatorBalance, column) + delta for column, delta in deltas.items()}
+        values['updated_at'] = datetime.utcnow()
+        db.session.execute(
+            update(CreatorBalance)
+            .where(CreatorBalance.creator_id == creator_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def _status_deltas(columns, amount, old_status, new_status):
+        """Ledger deltas for moving an amount from one status to another"""
+        deltas = {}
+        old_column = columns.get(old_status)
+        new_column = columns.get(new_status)
+        if old_column == new_column:
+            return deltas
+        if old_column:
+            deltas[old_column] = -amount
+        if new_column:
+            deltas[new_column] = deltas.get(new_column, 0) + amount
+        return deltas
+
+    @staticmethod
+    def record_transaction_status(transaction, old_status):
+        """
+        Reflect a tip status change in the ledger
+
+        Args:
+            transaction: Transaction with its new status set
+            old_status: Status before the change (None for new rows)
+        """
+        deltas = BalanceLedger._status_deltas(TRANSACTION_COLUMNS, transaction.amount, old_status, transaction.status)
+        BalanceLedger._adjust(transaction.creator_id, **deltas)
+
+    @staticmethod
+    def record_withdrawal_status(withdrawal, old_status):
+        """
+        Reflect a withdrawal status change in the ledger
+
+        Args:
+            withdrawal: Withdrawal with its new status set
+            old_status: Status before the change (None for new rows)
+        """
+        deltas = BalanceLedger._status_deltas(WITHDRAWAL_COLUMNS, withdrawal.amount, old_status, withdrawal.status)
+        BalanceLedger._adjust(withdrawal.creator_id, **deltas)
+
+    @staticmethod
+    def reserve_withdrawal(creator_id, amount):
+        """
+        Move an amount into pending withdrawals if the balance covers it
+
+        The balance check and the reservation are one conditional UPDATE on
+        the creator's ledger row, so concurrent withdrawals cannot overdraw
+        it and only withdrawals by the same creator contend with each other.
+        Does not commit.
+
+        Args:
+            creator_id: ID of the creator
+            amount: Amount to reserve
+
+        Returns:
+            bool: True if the amount was reserved
+        """
+        BalanceLedger._ensure(creator_id)
+        available = CreatorBalance.completed_tips - CreatorBalance.pending_withdrawals - CreatorBalance.withdrawn
+        return db.session.execute(
+            update(CreatorBalance)
+            .where(CreatorBalance.creator_id == creator_id, available >= amount)
+            .values(
+                pending_withdrawals=CreatorBalance.pending_withdrawals + amount,
+                updated_at=datetime.utcnow()
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+
+    @staticmethod
+    def get(creator_id):
+        """
+        Get a creator's ledger row, building it from source rows if missing
+
+        Returns:
+            CreatorBalance: The creator's balance
+        """
+        balance = CreatorBalance.query.get(creator_id)
+        if balance is None:
+            balance = BalanceLedger.rebuild(creator_id)[0]
+        return balance
+
+    @staticmethod
+    def compute(creator_id):
+        """
+        Compute a creator's balance from transactions and withdrawals
+
+        Returns:
+            dict: completed_tips, pending_withdrawals and withdrawn
+        """
+        snapshot = Creator.compute_balance(creator_id)
+        return {
+            'completed_tips': snapshot.completed_tips,
+            'pending_withdrawals': snapshot.pending_withdrawals,
+            'withdrawn': snapshot.withdrawn
+        }
+
+    @staticmethod
+    def rebuild(creator_id=None):
+        """
+        Recompute ledger rows from source rows
+
+        Args:
+            creator_id: Only rebuild this creator (default all creators)
+
+        Returns:
+            list: Rebuilt CreatorBalance rows
+        """
+        creator_ids = [creator_id] if creator_id else [row.id for row in db.session.query(Creator.id)]
+        balances = []
+        for cid in creator_ids:
+            balance = CreatorBalance.query.get(cid) or CreatorBalance(creator_id=cid)
+            for column, value in BalanceLedger.compute(cid).items():
+                setattr(balance, column, value)
+            balance.updated_at = datetime.utcnow()
+            db.session.add(balance)
+            balances.append(balance)
+
+        db.session.commit()
+        logging.info(f"Rebuilt {len(balances)} creator balance rows")
+        return balances
+
+    @staticmethod
+    def verify(tolerance=0.005):
+        """
+        Compare ledger rows against source rows
+
+        Returns:
+            list: (creator_id, column, ledger value, computed value) for each mismatch
+        """
+        mismatches = []
+        for (cid,) in db.session.query(Creator.id):
+            balance = CreatorBalance.query.get(cid)
+            for column, expected in BalanceLedger.compute(cid).items():
+                actual = getattr(balance, column) if balance else 0.0
+                if abs(actual - expected) > tolerance:
+                    mismatches.append((cid, column, actual, expected))
+        return mismatches
@@ -0,0 +1,127 @@
+from collections import OrderedDict, namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from .. import db
+from ..models.user import Creator
+import logging
+import threading
+import time
+
+class CreatorSnapshot(namedtuple('CreatorSnapshot', [
+        'id', 'username', 'email', 'phone_number', 'display_name', 'active', 'tip_link_id'])):
+    """Read-only identity fields of a creator, safe to share between requests"""
+    __slots__ = ()
+
+    @classmethod
+    def from_creator(cls, creator):
+        return cls(*(getattr(creator, field) for field in cls._fields))
+
+    @property
+    def display_name_or_username(self):
+        """Get display name or fallback to username"""
+        return self.display_name or self.username
+
+class CreatorCache:
+    """
+    Process-local TTL/LRU cache of creator identity snapshots
+
+    Used by the request loader so authenticated requests do not query the
+    creator table on every hit. Entries are dropped when a creator row is
+    updated or deleted and the change commits; the TTL bounds staleness
+    for changes made by other processes.
+    """
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+    _listeners = []
+    ttl = 60
+    max_size = 1024
+
+    @classmethod
+    def init_app(cls, app):
+        """
+        Configure cache limits from the app config
+
+        Args:
+            app: Flask application
+        """
+        cls.ttl = app.config.get('CREATOR_CACHE_TTL', 60)
+        cls.max_size = app.config.get('CREATOR_CACHE_SIZE', 1024)
+        cls.clear()
+
+    @classmethod
+    def get(cls, creator_id):
+        """
+        Get a creator snapshot, loading it on a miss
+
+        Args:
+            creator_id: ID of the creator
+
+        Returns:
+            CreatorSnapshot: The snapshot, or None if no such creator exists
+        """
+        now = time.monotonic()
+        with cls._lock:
+            entry = cls._entries.get(creator_id)
+            if entry and entry[0] > now:
+                cls._entries.move_to_end(creator_id)
+                return entry[1]
+
+        creator = db.session.get(Creator, creator_id)
+        if creator is None:
+            cls.invalidate(creator_id)
+            return None
+
+        snapshot = CreatorSnapshot.from_creator(creator)
+        if cls.ttl > 0:
+            with cls._lock:
+                cls._entries[creator_id] = (now + cls.ttl, snapshot)
+                cls._entries.move_to_end(creator_id)
+                while len(cls._entries) > cls.max_size:
+                    cls._entries.popitem(last=False)
+        return snapshot
+
+    @classmethod
+    def add_invalidation_listener(cls, listener):
+        """
+        Call listener(creator_id) whenever a creator's snapshot is invalidated
+
+        Lets caches derived from creator fields (such as rendered pages)
+        follow the same invalidation.
+        """
+        cls._listeners.append(listener)
+
+    @classmethod
+    def invalidate(cls, creator_id):
+        """Drop a creator's cached snapshot"""
+        with cls._lock:
+            cls._entries.pop(creator_id, None)
+        for listener in cls._listeners:
+            listener(creator_id)
+
+    @classmethod
+    def clear(cls):
+        """Drop all cached snapshots"""
+        with cls._lock:
+            cls._entries.clear()
+
+# Collect changed creators per session and invalidate once the change is
+# committed, so a concurrent request cannot re-cache the old row
+
+@event.listens_for(Creator, 'after_update')
+@event.listens_for(Creator, 'after_delete')
+def _mark_creator_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_creators', set()).add(target.id)
+    CreatorCache.invalidate(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_creators(session):
+    for creator_id in session.info.pop('changed_creators', ()):
+        CreatorCache.invalidate(creator_id)
+        logging.debug(f"Invalidated cached snapshot for creator {creator_id}")
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_creators(session):
+    session.info.pop('changed_creators', None)
@@ -0,0 +1,117 @@
+from .. import db
+from datetime import datetime
+from sqlalchemy import insert, or_, and_
+from sqlalchemy.orm import load_only
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+import base64
+import os
+import socket
+
+def insert_ignore(model, values, index_elements):
+    """
+    Insert a row unless one with the same key already exists
+
+    Uses the dialect's native ON CONFLICT DO NOTHING where available so the
+    check and the insert are a single statement. Does not commit.
+
+    Args:
+        model: Model class to insert into
+        values: Column values for the new row
+        index_elements: Column names of the unique key
+
+    Returns:
+        bool: True if a row was inserted
+    """
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        stmt = sqlite.insert(model).values(**values).on_conflict_do_nothing(index_elements=index_elements)
+    elif dialect == 'postgresql':
+        stmt = postgresql.insert(model).values(**values).on_conflict_do_nothing(index_elements=index_elements)
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = insert(model).values(**values).prefix_with('IGNORE')
+    else:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(model).values(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    return db.session.execute(stmt).rowcount == 1
+
+def encode_cursor(created_at, row_id):
+    """Encode a (created_at, id) keyset position as an opaque URL-safe token"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a token produced by encode_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_page(query, model, limit, cursor=None, columns=None):
+    """
+    Fetch one page of rows newest first using (created_at, id) keyset pagination
+
+    Every page is an index range scan starting at the cursor, so deep pages
+    cost the same as the first one, unlike OFFSET.
+
+    Args:
+        query: Base query on model, already filtered
+        model: Model class with created_at and id columns
+        limit: Maximum rows per page
+        cursor: Token from a previous page's next_cursor (optional)
+        columns: Attribute names to load; other columns stay deferred (optional)
+
+    Returns:
+        tuple: (rows, next_cursor) where next_cursor is None on the last page
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if columns:
+        query = query.options(load_only(*[getattr(model, column) for column in columns]))
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < row_id)
+        ))
+
+    # One extra row tells us whether another page exists
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+def lock_owner(*parts, max_length=64):
+    """
+    Identify this process for a locked_by column
+
+    Returns hostname:pid followed by any extra parts. The hostname is cut
+    short when needed so the whole value fits max_length, since a
+    truncated value would never match in an ownership check.
+
+    Args:
+        parts: Extra identifiers, e.g. a thread ident
+        max_length: Length of the locked_by column
+
+    Returns:
+        str: The owner identifier
+    """
+    suffix = ''.join(f":{part}" for part in (os.getpid(),) + parts)
+    return socket.gethostname()[:max(0, max_length - len(suffix))] + suffix
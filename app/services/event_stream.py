@@ -0,0 +1,218 @@
+from .. import db
+from ..models.overlay_event import OverlayEvent
+from sqlalchemy import func
+import json
+import logging
+import queue
+import threading
+
+# How long browsers wait before reconnecting a dropped stream
+RECONNECT_DELAY_MS = 3000
+
+# Fields of each event the overlay renders; other events are not streamed
+OVERLAY_FIELDS = {'new_tip': ('name', 'amount', 'message')}
+
+class Subscription:
+    """
+    One SSE connection's bounded event queue
+
+    A subscriber that falls more than queue_size events behind is marked
+    overflowed instead of growing without bound; its stream then ends and
+    the browser reconnects with Last-Event-ID to resume from history.
+    """
+
+    def __init__(self, creator_id, queue_size):
+        self.creator_id = creator_id
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+class EventStream:
+    """
+    Server-Sent Events fan-out of the overlay events SocketManager records
+
+    A single background thread per process tails the overlay_event table
+    and hands new rows to the subscribers of each creator, so an idle
+    overlay costs one queue rather than a Socket.IO session. Events
+    recorded in this process wake the thread immediately; events from other
+    processes arrive within OVERLAY_SSE_POLL_INTERVAL seconds.
+    
+    Only the OVERLAY_FIELDS of each event are sent; the stream is shown
+    on screen, so it never carries receipts or contact details.
+    """
+
+    _app = None
+    _subscribers = {}
+    _lock = threading.Lock()
+    _wakeup = threading.Event()
+    _thread = None
+    _last_id = None
+    _poll_interval = 1.0
+    _heartbeat = 15
+    _queue_size = 100
+
+    @classmethod
+    def init_app(cls, app):
+        """
+        Configure the stream from the app config
+
+        Args:
+            app: Flask application
+        """
+        cls._app = app
+        cls._poll_interval = app.config.get('OVERLAY_SSE_POLL_INTERVAL', 1.0)
+        cls._heartbeat = app.config.get('OVERLAY_SSE_HEARTBEAT', 15)
+        cls._queue_size = app.config.get('OVERLAY_SSE_QUEUE_SIZE', 100)
+
+    @classmethod
+    def notify(cls):
+        """Wake the tailing thread after an event was recorded"""
+        cls._wakeup.set()
+
+    @classmethod
+    def subscribe(cls, creator_id):
+        """
+        Start receiving a creator's events
+
+        Must be called inside an app context. Events recorded after this
+        call are delivered to the returned subscription.
+
+        Args:
+            creator_id: The ID of the creator
+
+        Returns:
+            Subscription: The new subscription
+        """
+        subscription = Subscription(creator_id, cls._queue_size)
+        with cls._lock:
+            if cls._last_id is None:
+                # Start tailing from here; anything older is served by replay
+                cls._last_id = db.session.query(func.coalesce(func.max(OverlayEvent.id), 0)).scalar()
+            cls._subscribers.setdefault(creator_id, set()).add(subscription)
+
+            if cls._thread is None or not cls._thread.is_alive():
+                cls._thread = threading.Thread(target=cls._run, name='overlay-sse', daemon=True)
+                cls._thread.start()
+        return subscription
+
+    @classmethod
+    def unsubscribe(cls, subscription):
+        """Stop delivering events to a subscription"""
+        with cls._lock:
+            subscribers = cls._subscribers.get(subscription.creator_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del cls._subscribers[subscription.creator_id]
+            if not cls._subscribers:
+                # Nobody is listening; the next subscriber re-seeds the cursor
+                cls._last_id = None
+
+    @classmethod
+    def _run(cls):
+        """Tail overlay_event and fan rows out to subscribers"""
+        with cls._app.app_context():
+            while True:
+                cls._wakeup.wait(cls._poll_interval)
+                cls._wakeup.clear()
+                try:
+                    cls._poll()
+                except Exception as e:
+                    logging.error(f"Error polling overlay events: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    @staticmethod
+    def overlay_data(event, data):
+        """
+        Reduce an event to the fields the overlay renders
+
+        Returns:
+            dict: The event's OVERLAY_FIELDS and 'seq', or None if it is not streamed
+        """
+        fields = OVERLAY_FIELDS.get(event)
+        if fields is None:
+            return None
+        overlay = {field: data.get(field) for field in fields}
+        overlay['seq'] = data['seq']
+        return overlay
+
+    @classmethod
+    def _poll(cls):
+        with cls._lock:
+            last_id = cls._last_id
+        if last_id is None:
+            return
+
+        # Every creator's rows: subscribers added while this query runs must
+        # still get their events, since the cursor is shared
+        rows = OverlayEvent.query\
+            .filter(OverlayEvent.id > last_id)\
+            .order_by(OverlayEvent.id)\
+            .limit(500)\
+            .all()
+        if not rows:
+            return
+
+        with cls._lock:
+            for row in rows:
+                subscribers = cls._subscribers.get(row.creator_id)
+                if not subscribers:
+                    continue
+                data = row.data
+                data['seq'] = row.id
+                data = cls.overlay_data(row.event, data)
+                if data is None:
+                    continue
+                for subscription in subscribers:
+                    subscription.put((row.id, row.event, data))
+            if cls._last_id is not None:
+                cls._last_id = max(cls._last_id, rows[-1].id)
+
+        if len(rows) == 500:
+            # More are waiting; don't sleep before the next page
+            cls._wakeup.set()
+
+    @staticmethod
+    def format(seq, event, data):
+        """Encode one event in text/event-stream framing"""
+        return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    @classmethod
+    def stream(cls, subscription, backlog=(), last_seq=0):
+        """
+        Generate an SSE response body for a subscription
+
+        Args:
+            subscription: Subscription from subscribe()
+            backlog: Replayed {'event', 'data'} dicts to send first
+            last_seq: Sequence number the client already has
+
+        Yields:
+            str: text/event-stream chunks, with comment heartbeats while idle
+        """
+        try:
+            yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+            for item in backlog:
+                last_seq = max(last_seq, item['data']['seq'])
+                data = cls.overlay_data(item['event'], item['data'])
+                if data is not None:
+                    yield cls.format(data['seq'], item['event'], data)
+
+            while not subscription.overflowed:
+                try:
+                    seq, event, data = subscription.queue.get(timeout=cls._heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if seq <= last_seq:
+                    continue  # Already sent as part of the backlog
+                last_seq = seq
+                yield cls.format(seq, event, data)
+        finally:
+            cls.unsubscribe(subscription)
@@ -0,0 +1,276 @@
+from .. import db
+from ..models.outbound_job import OutboundJob
+from .db_utils import lock_owner
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_, and_
+import json
+import logging
+import random
+import time
+
+class PermanentJobError(Exception):
+    """Raised by a job handler when retrying cannot succeed"""
+    pass
+
+class JobQueue:
+    """Durable database-backed queue for outbound M-Pesa calls"""
+
+    # kind -> (handler, dead-letter hook)
+    _handlers = {}
+
+    BACKOFF_BASE = 2      # seconds
+    BACKOFF_MAX = 300     # seconds
+
+    @classmethod
+    def register(cls, kind, on_dead=None):
+        """
+        Register a handler for a job kind
+
+        Args:
+            kind: Job kind name
+            on_dead: Optional callable(job, error) invoked when the job is dead-lettered
+        """
+        def decorator(func):
+            cls._handlers[kind] = (func, on_dead)
+            return func
+        return decorator
+
+    @classmethod
+    def enqueue(cls, kind, payload, max_attempts=5, delay=0):
+        """
+        Add a job to the queue
+
+        Args:
+            kind: Registered job kind
+            payload: JSON-serializable job arguments
+            max_attempts: Attempts before the job is dead-lettered
+            delay: Seconds to wait before the job becomes available
+
+        Returns:
+            OutboundJob: The queued job
+        """
+        if kind not in cls._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job = OutboundJob(
+            kind=kind,
+            payload=json.dumps(payload),
+            max_attempts=max_attempts,
+            available_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        logging.info(f"Enqueued {kind} job {job.id}")
+        return job
+
+    @classmethod
+    def _claimable(cls, now):
+        """Filter for jobs that are ready or whose visibility timeout lapsed"""
+        return or_(
+            and_(OutboundJob.status == OutboundJob.STATUS_QUEUED, OutboundJob.available_at <= now),
+            and_(OutboundJob.status == OutboundJob.STATUS_RUNNING, OutboundJob.locked_until < now)
+        )
+
+    @classmethod
+    def claim(cls, worker_id, limit=10, visibility_timeout=300):
+        """
+        Claim ready jobs for a worker
+
+        Each job is claimed with a conditional UPDATE so concurrent workers
+        never run the same job twice within its visibility timeout.
+
+        Args:
+            worker_id: Identifier of the claiming worker
+            limit: Maximum number of jobs to claim
+            visibility_timeout: Seconds before an unfinished job is handed to another worker
+
+        Returns:
+            list: Claimed OutboundJob objects
+        """
+        now = datetime.utcnow()
+        candidate_ids = [row.id for row in db.session.query(OutboundJob.id)
+            .filter(cls._claimable(now))
+            .order_by(OutboundJob.available_at)
+            .limit(limit)]
+
+        claimed_ids = []
+        for job_id in candidate_ids:
+            result = db.session.execute(
+                update(OutboundJob)
+                .where(OutboundJob.id == job_id, cls._claimable(now))
+                .values(
+                    status=OutboundJob.STATUS_RUNNING,
+                    locked_by=worker_id,
+                    locked_until=now + timedelta(seconds=visibility_timeout),
+                    attempts=OutboundJob.attempts + 1,
+                    updated_at=now
+                )
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                claimed_ids.append(job_id)
+
+        if not claimed_ids:
+            return []
+        return OutboundJob.query.filter(OutboundJob.id.in_(claimed_ids)).all()
+
+    @classmethod
+    def _settle(cls, job, worker_id, **values):
+        """
+        Write a claimed job's outcome if this worker still holds it
+
+        Once the visibility timeout lapses another worker may have claimed
+        the job, so the write is conditional on the claim being ours.
+
+        Returns:
+            bool: True if the job was updated
+        """
+        settled = db.session.execute(
+            update(OutboundJob)
+            .where(
+                OutboundJob.id == job.id,
+                OutboundJob.locked_by == worker_id,
+                OutboundJob.status == OutboundJob.STATUS_RUNNING
+            )
+            .values(locked_until=None, updated_at=datetime.utcnow(), **values)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        db.session.commit()
+        if not settled:
+            logging.warning(f"{job.kind} job {job.id} is no longer held by {worker_id}; outcome discarded")
+        return settled
+
+    @classmethod
+    def renew(cls, job, worker_id, visibility_timeout):
+        """
+        Extend a claimed job's visibility timeout before running it
+
+        Returns:
+            bool: False if the claim lapsed and the job must not be run
+        """
+        renewed = db.session.execute(
+            update(OutboundJob)
+            .where(
+                OutboundJob.id == job.id,
+                OutboundJob.locked_by == worker_id,
+                OutboundJob.status == OutboundJob.STATUS_RUNNING
+            )
+            .values(locked_until=datetime.utcnow() + timedelta(seconds=visibility_timeout))
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        db.session.commit()
+        return renewed
+
+    @classmethod
+    def complete(cls, job, worker_id):
+        """Mark a claimed job as done"""
+        cls._settle(
+            job, worker_id,
+            status=OutboundJob.STATUS_COMPLETED,
+            completed_at=datetime.utcnow(),
+            last_error=None
+        )
+
+    @classmethod
+    def fail(cls, job, error, worker_id, permanent=False):
+        """
+        Record a failed attempt and schedule a retry or dead-letter the job
+
+        Retries use exponential backoff with full jitter.
+        """
+        last_error = str(error)[:500]
+
+        if permanent or job.attempts >= job.max_attempts:
+            if not cls._settle(job, worker_id, status=OutboundJob.STATUS_DEAD, last_error=last_error):
+                return
+            logging.error(f"Dead-lettered {job.kind} job {job.id} after {job.attempts} attempts: {error}")
+
+            _, on_dead = cls._handlers.get(job.kind, (None, None))
+            if on_dead:
+                try:
+                    on_dead(job, error)
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Dead-letter hook failed for job {job.id}: {str(e)}", exc_info=True)
+            return
+
+        backoff = min(cls.BACKOFF_BASE * (2 ** (job.attempts - 1)), cls.BACKOFF_MAX)
+        delay = random.uniform(0, backoff)
+        if cls._settle(
+            job, worker_id,
+            status=OutboundJob.STATUS_QUEUED,
+            available_at=datetime.utcnow() + timedelta(seconds=delay),
+            last_error=last_error
+        ):
+            logging.warning(f"{job.kind} job {job.id} attempt {job.attempts} failed: {error}. Retrying in {delay:.1f}s")
+
+    @classmethod
+    def requeue(cls, job_id):
+        """Move a dead-lettered job back onto the queue"""
+        job = OutboundJob.query.get(job_id)
+        if not job:
+            raise ValueError(f"Job {job_id} not found")
+
+        job.status = OutboundJob.STATUS_QUEUED
+        job.attempts = 0
+        job.available_at = datetime.utcnow()
+        job.last_error = None
+        db.session.commit()
+        return job
+
+    @classmethod
+    def run_job(cls, job, worker_id):
+        """Execute a single job claimed by worker_id"""
+        handler, _ = cls._handlers.get(job.kind, (None, None))
+        if handler is None:
+            cls.fail(job, f"No handler registered for {job.kind}", worker_id, permanent=True)
+            return
+
+        try:
+            handler(job.data)
+        except PermanentJobError as e:
+            db.session.rollback()
+            cls.fail(job, e, worker_id, permanent=True)
+        except Exception as e:
+            db.session.rollback()
+            cls.fail(job, e, worker_id)
+        else:
+            cls.complete(job, worker_id)
+
+    @classmethod
+    def run_worker(cls, app, batch_size=10, poll_interval=1.0, visibility_timeout=300, once=False):
+        """
+        Process queued jobs until interrupted
+
+        Args:
+            app: Flask application
+            batch_size: Jobs claimed per poll
+            poll_interval: Seconds to sleep when the queue is empty
+            visibility_timeout: Seconds a claimed job stays hidden from other workers;
+                must exceed the longest single attempt, retries included
+            once: Drain ready jobs a single time and return
+
+        Returns:
+            int: Number of jobs processed
+        """
+        worker_id = lock_owner()
+        processed = 0
+        logging.info(f"Job worker {worker_id} started")
+
+        while True:
+            with app.app_context():
+                jobs = cls.claim(worker_id, limit=batch_size, visibility_timeout=visibility_timeout)
+                for job in jobs:
+                    # Jobs in a batch run one after another; restart the clock for each
+                    if not cls.renew(job, worker_id, visibility_timeout):
+                        logging.warning(f"Lost claim on {job.kind} job {job.id} before running it")
+                        continue
+                    logging.debug(f"Running {job.kind} job {job.id} (attempt {job.attempts})")
+                    cls.run_job(job, worker_id)
+                    processed += 1
+
+            if once and not jobs:
+                return processed
+            if not jobs:
+                time.sleep(poll_interval)
@@ -1,4 +1,6 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 import base64
 from datetime import datetime
 import logging
@@ -7,6 +9,33 @@ import uuid
 import time
 import os
 import json
+import threading
+from .token_store import FileTokenStore
+
+class PaymentOutcomeUnknown(Exception):
+    """Raised when a payment request may have reached M-Pesa but no answer came back"""
+    pass
+
+def _never_sent(error):
+    """Check if a request error happened before any bytes reached M-Pesa"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError)
+
+def _ambiguous_response(response):
+    """
+    Check if a response leaves open whether M-Pesa acted on the request
+
+    M-Pesa reports its own rejections with an errorCode body; a 5xx
+    without one comes from a gateway that may already have forwarded it.
+    """
+    if response.status_code < 500:
+        return False
+    try:
+        return 'errorCode' not in response.json()
+    except ValueError:
+        return True
 
 def handle_api_errors(func):
     """Decorator to handle M-Pesa API errors consistently"""
@@ -22,6 +51,34 @@ def handle_api_errors(func):
             raise
     return wrapper
 
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that keeps connections alive and tracks pool reuse"""
+
+    def pool_stats(self):
+        """
+        Aggregate connection reuse across every host pool held by the adapter
+
+        Returns:
+            dict: requests sent, connections opened, pool hits and misses
+        """
+        requests_sent = 0
+        connections_opened = 0
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            connections_opened += pool.num_connections
+
+        return {
+            'pools': len(pools),
+            'requests': requests_sent,
+            'connections': connections_opened,
+            'pool_hits': max(requests_sent - connections_opened, 0),
+            'pool_misses': connections_opened
+        }
+
 class MpesaClient:
     """Client for interacting with M-Pesa API"""
     
@@ -29,6 +86,15 @@ class MpesaClient:
         self.app = app
         self.token = None
         self.token_expiry = None
+        self.token_store = None
+        self.token_refresh_ahead = 0
+        self._token_lock = threading.Lock()
+        self._refresher_thread = None
+        
+        # Pooled keep-alive transport shared by all request threads
+        self.session = None
+        self.adapter = None
+        self.timeout = (5, 30)
         
         # Credentials and configuration
         self.consumer_key = None
@@ -81,6 +147,26 @@ class MpesaClient:
         self.b2c_queue_timeout_url = f"{self.callback_base_url}/withdrawals/b2c/timeout"
         self.b2c_result_url = f"{self.callback_base_url}/withdrawals/b2c/result"
         
+        # Token caching: optional store shared between worker processes and
+        # refresh-ahead window for the background refresher (0 disables it)
+        if app.config.get('MPESA_TOKEN_STORE', 'memory') == 'file':
+            self.token_store = FileTokenStore(app.config.get(
+                'MPESA_TOKEN_STORE_PATH',
+                os.path.join(app.instance_path, 'mpesa_token.json')
+            ))
+        self.token_refresh_ahead = 0 if self.test_mode else app.config.get('MPESA_TOKEN_REFRESH_AHEAD', 300)
+        
+        # Set up the pooled HTTP transport
+        self.timeout = (
+            app.config.get('MPESA_HTTP_CONNECT_TIMEOUT', 5),
+            app.config.get('MPESA_HTTP_READ_TIMEOUT', 30)
+        )
+        self.session, self.adapter = self._build_session(
+            pool_connections=app.config.get('MPESA_HTTP_POOL_CONNECTIONS', 4),
+            pool_maxsize=app.config.get('MPESA_HTTP_POOL_MAXSIZE', 20),
+            keep_alive=app.config.get('MPESA_HTTP_KEEP_ALIVE', True)
+        )
+        
         # Log configuration
         logging.info("M-Pesa Client Configuration:")
         logging.info(f"Environment: {self.environment}")
@@ -88,29 +174,118 @@ class MpesaClient:
         logging.info(f"Base URL: {self.base_url}")
         logging.info(f"B2C Result URL: {self.b2c_result_url}")
         logging.info(f"B2C Timeout URL: {self.b2c_queue_timeout_url}")
+        logging.info(f"HTTP Timeouts (connect, read): {self.timeout}")
         
         app.mpesa = self
 
+    @staticmethod
+    def _build_session(pool_connections, pool_maxsize, keep_alive=True):
+        """
+        Build a requests session backed by a bounded keep-alive connection pool
+        
+        Args:
+            pool_connections: Number of per-host pools to keep
+            pool_maxsize: Maximum connections kept alive per host
+            keep_alive: Whether to reuse connections between requests
+            
+        Returns:
+            tuple: (requests.Session, PooledHTTPAdapter)
+        """
+        session = requests.Session()
+        adapter = PooledHTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0,  # Retries are handled explicitly by the client
+            pool_block=False
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        return session, adapter
+
+    def _request(self, method, url, timeout=None, **kwargs):
+        """Send a request over the pooled session"""
+        if self.session is None:
+            self.session, self.adapter = self._build_session(4, 20)
+        response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            # Walking every pool is not free; only do it when the line is kept
+            logging.debug(f"M-Pesa HTTP pool stats: {self.pool_stats()}")
+        return response
+
+    def pool_stats(self):
+        """Get connection pool hit/miss counters for this client"""
+        if self.adapter is None:
+            return {'pools': 0, 'requests': 0, 'connections': 0, 'pool_hits': 0, 'pool_misses': 0}
+        return self.adapter.pool_stats()
+
     def get_auth_token(self):
         """Get OAuth token, using cached version if still valid"""
-        if self.token and self.token_expiry and time.time() < self.token_expiry:
-            return self.token
+        token = self._get_cached_token()
+        if token:
+            return token
+
+        return self._refresh_auth_token()
 
+    def _get_cached_token(self, min_validity=0):
+        """Return a cached token valid for at least min_validity more seconds"""
+        token, expiry = self.token, self.token_expiry
+        if token and expiry and time.time() + min_validity < expiry:
+            return token
+
+        if self.token_store:
+            token, expiry = self.token_store.load()
+            if token and expiry and time.time() + min_validity < expiry:
+                self.token, self.token_expiry = token, expiry
+                return token
+
+        return None
+
+    def _refresh_auth_token(self, min_validity=0):
+        """
+        Fetch a new OAuth token with single-flight semantics
+        
+        Only one thread per process (and one process per token store) calls the
+        auth endpoint; everyone else waits on the lock and reuses its result.
+        """
+        with self._token_lock:
+            # Another thread may have refreshed while we waited
+            token = self._get_cached_token(min_validity)
+            if token:
+                return token
+
+            if self.token_store:
+                with self.token_store.refresh_lock():
+                    # Another worker process may have refreshed while we waited
+                    token = self._get_cached_token(min_validity)
+                    if token:
+                        return token
+                    token = self._fetch_auth_token()
+                    self.token_store.save(self.token, self.token_expiry)
+            else:
+                token = self._fetch_auth_token()
+
+        self._start_token_refresher()
+        return token
+
+    def _fetch_auth_token(self):
+        """Request a token from the M-Pesa OAuth endpoint"""
         auth_string = base64.b64encode(
             f"{self.consumer_key}:{self.consumer_secret}".encode()
         ).decode()
 
         try:
-            response = requests.get(
+            response = self._request(
+                'GET',
                 self.auth_url,
-                headers={'Authorization': f'Basic {auth_string}'},
-                timeout=10
+                headers={'Authorization': f'Basic {auth_string}'}
             )
             response.raise_for_status()
             result = response.json()
             
             self.token = result['access_token']
-            self.token_expiry = time.time() + (result['expires_in'] - 60)  # Buffer of 60s
+            self.token_expiry = time.time() + (int(result['expires_in']) - 60)  # Buffer of 60s
+            logging.info("Fetched new M-Pesa auth token")
             
             return self.token
             
@@ -118,20 +293,56 @@ class MpesaClient:
             logging.error(f"Error getting auth token: {str(e)}")
             raise Exception("Could not authenticate with M-Pesa")
 
+    def _start_token_refresher(self):
+        """Start the background thread that refreshes the token ahead of expiry"""
+        if not self.token_refresh_ahead or self._refresher_thread is not None:
+            return
+
+        with self._token_lock:
+            if self._refresher_thread is not None:
+                return
+            self._refresher_thread = threading.Thread(
+                target=self._token_refresh_loop,
+                name='mpesa-token-refresher',
+                daemon=True
+            )
+            self._refresher_thread.start()
+
+    def _token_refresh_loop(self):
+        """Keep the cached token fresh so request threads never block on OAuth"""
+        while True:
+            expiry = self.token_expiry or 0
+            delay = max(expiry - self.token_refresh_ahead - time.time(), 1)
+            time.sleep(delay)
+            try:
+                self._refresh_auth_token(min_validity=self.token_refresh_ahead)
+            except Exception as e:
+                logging.warning(f"Background M-Pesa token refresh failed: {str(e)}")
+                time.sleep(30)
+
     @handle_api_errors
-    def stk_push(self, phone_number, amount, callback_url, account_reference=None, transaction_desc=None):
+    def stk_push(self, phone_number, amount, callback_url, account_reference=None, transaction_desc=None, retries=2):
         """
         Initiate STK Push payment
         
+        Each attempt prompts the customer's phone, so only failures that
+        provably never reached M-Pesa and M-Pesa's own rejections are
+        retried. Anything else raises PaymentOutcomeUnknown.
+        
         Args:
             phone_number: Customer phone number (format: 254XXXXXXXXX)
             amount: Amount to charge
             callback_url: URL for M-Pesa to send payment notification
             account_reference: Reference for the transaction (optional)
             transaction_desc: Description of the transaction (optional)
+            retries: Extra attempts after a safe failure; pass 0 when the
+                caller retries itself
             
         Returns:
             dict: M-Pesa API response
+            
+        Raises:
+            PaymentOutcomeUnknown: If a prompt may or may not have been sent
         """
         try:
             # Get access token
@@ -170,19 +381,28 @@ class MpesaClient:
             }
 
             # Make request with retries
-            max_retries = 2
+            max_retries = retries
             retry_delay = 1
             last_error = None
 
             for attempt in range(max_retries + 1):
                 try:
                     logging.info(f"STK push attempt {attempt + 1}/{max_retries + 1}")
-                    response = requests.post(
-                        self.stkpush_url,
-                        json=payload,
-                        headers=headers,
-                        timeout=30
-                    )
+                    try:
+                        response = self._request(
+                            'POST',
+                            self.stkpush_url,
+                            json=payload,
+                            headers=headers
+                        )
+                    except requests.exceptions.RequestException as e:
+                        if _never_sent(e):
+                            raise
+                        raise PaymentOutcomeUnknown(f"No response to STK push {account_reference}: {str(e)}") from e
+                    if _ambiguous_response(response):
+                        raise PaymentOutcomeUnknown(
+                            f"STK push {account_reference} got HTTP {response.status_code} without an M-Pesa error"
+                        )
                     
                     logging.debug(f"M-Pesa response status: {response.status_code}")
                     logging.debug(f"M-Pesa response headers: {dict(response.headers)}")
@@ -203,6 +423,8 @@ class MpesaClient:
                     logging.info(f"STK push successful: {result['CheckoutRequestID']}")
                     return result
 
+                except PaymentOutcomeUnknown:
+                    raise
                 except requests.exceptions.RequestException as e:
                     last_error = e
                     logging.error(f"Network error on attempt {attempt + 1}: {e}")
@@ -269,11 +491,11 @@ class MpesaClient:
             "CheckoutRequestID": checkout_request_id
         }
 
-        response = requests.post(
+        response = self._request(
+            'POST',
             f"{self.base_url}/mpesa/stkpushquery/v1/query",
             json=payload,
-            headers=headers,
-            timeout=30
+            headers=headers
         )
         response.raise_for_status()
         
@@ -433,12 +655,13 @@ class MpesaClient:
             logging.info(f"Callback data: {json.dumps(callback_data, indent=2)}")
             
             # Send the callback with a shorter timeout
-            response = requests.post(
+            response = self._request(
+                'POST',
                 callback_url,
                 json=callback_data,
                 headers={'Content-Type': 'application/json'},
                 verify=False,  # Skip SSL verification for localhost
-                timeout=5  # Reduced timeout
+                timeout=(self.timeout[0], 5)  # Reduced timeout
             )
             
             logging.info(f"Sandbox callback response: {response.status_code} - {response.text}")
@@ -448,18 +671,33 @@ class MpesaClient:
             raise
 
     @handle_api_errors
-    def b2c_payment(self, phone_number, amount, remarks=None):
+    def b2c_payment(self, phone_number, amount, remarks=None, originator_conversation_id=None, retries=2):
         """
         Initiate a B2C payment (Business to Customer)
         
+        The request is only retried when it provably never reached M-Pesa
+        (the connection was never made) or M-Pesa answered with an error.
+        A read timeout, a dropped connection or a bare gateway 5xx may
+        follow an accepted payout, so it raises PaymentOutcomeUnknown
+        instead of sending the money again.
+        
         Args:
             phone_number: The phone number to send money to (format: 254XXXXXXXXX)
             amount: Amount to send
             remarks: Optional remarks for the transaction
+            originator_conversation_id: Caller's stable ID for this payout,
+                echoed in the result callback
+            retries: Extra attempts after a safe failure; pass 0 when the
+                caller retries itself
             
         Returns:
             dict: M-Pesa API response with ConversationID
+            
+        Raises:
+            PaymentOutcomeUnknown: If the payout may or may not have been accepted
         """
+        originator_conversation_id = originator_conversation_id or str(uuid.uuid4())
+
         if self.test_mode:
             logging.info("Test mode: Returning mock B2C response")
             test_conversation_id = str(uuid.uuid4())
@@ -478,7 +716,7 @@ class MpesaClient:
             return {
                 'test_mode': True,
                 'ConversationID': test_conversation_id,
-                'OriginatorConversationID': str(uuid.uuid4()),
+                'OriginatorConversationID': originator_conversation_id,
                 'ResponseCode': '0',
                 'ResponseDescription': 'Accept the service request successfully.'
             }
@@ -496,6 +734,7 @@ class MpesaClient:
         }
         
         payload = {
+            'OriginatorConversationID': originator_conversation_id,
             'InitiatorName': self.initiator_name,
             'SecurityCredential': self.security_credential,
             'CommandID': 'BusinessPayment',
@@ -509,7 +748,7 @@ class MpesaClient:
         }
 
         # Make request with retries
-        max_retries = 2
+        max_retries = retries
         retry_delay = 1
         last_error = None
 
@@ -521,12 +760,23 @@ class MpesaClient:
                 logging.debug(f"Payload: {payload}")
                 logging.debug(f"Attempt: {attempt + 1}/{max_retries + 1}")
                 
-                response = requests.post(
-                    self.b2c_url,
-                    json=payload,
-                    headers=headers,
-                    timeout=30
-                )
+                try:
+                    response = self._request(
+                        'POST',
+                        self.b2c_url,
+                        json=payload,
+                        headers=headers
+                    )
+                except requests.exceptions.RequestException as e:
+                    if _never_sent(e):
+                        raise  # Never connected, so safe to retry
+                    raise PaymentOutcomeUnknown(
+                        f"No response to B2C payment {originator_conversation_id}: {str(e)}"
+                    ) from e
+                if _ambiguous_response(response):
+                    raise PaymentOutcomeUnknown(
+                        f"B2C payment {originator_conversation_id} got HTTP {response.status_code} without an M-Pesa error"
+                    )
                 
                 logging.debug("=== B2C Payment Response ===")
                 logging.debug(f"Status Code: {response.status_code}")
@@ -562,6 +812,8 @@ class MpesaClient:
                     
                 return result
 
+            except PaymentOutcomeUnknown:
+                raise
             except Exception as e:
                 last_error = e
                 if attempt < max_retries:
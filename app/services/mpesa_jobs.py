@@ -0,0 +1,71 @@
+from ..models.transaction import Transaction
+from ..models.withdrawal import Withdrawal
+from .job_queue import JobQueue, PermanentJobError
+from .mpesa import PaymentOutcomeUnknown
+from .stk_service import StkPushService
+from .transaction_service import TransactionService
+from .withdrawal_service import WithdrawalService
+import logging
+
+# Job handlers executed by the worker started with `manage.py run-worker`.
+# Handlers raise to request a retry; the on_dead hooks settle the record
+# once retries are exhausted so nothing stays pending forever. The job
+# queue owns retries, so handlers ask the M-Pesa client for none of its own.
+
+class UnknownPaymentOutcome(PermanentJobError):
+    """A payment request got no answer, so M-Pesa may already have acted on it"""
+    pass
+
+def _fail_stk_push(job, error):
+    """Mark the tip failed when its STK push is dead-lettered"""
+    if isinstance(error, UnknownPaymentOutcome):
+        # A prompt may be on the tipper's phone; the stale-transaction sweep settles it
+        logging.error(f"Tx ID {job.data.get('transaction_id')} left pending: {error}")
+        return
+
+    transaction = Transaction.query.get(job.data.get('transaction_id'))
+    if transaction and transaction.is_pending and not transaction.mpesa_request_id:
+        TransactionService.update_transaction_status(transaction.id, Transaction.STATUS_FAILED)
+
+@JobQueue.register('stk_push', on_dead=_fail_stk_push)
+def run_stk_push(payload):
+    """Send a queued STK push"""
+    transaction = Transaction.query.get(payload['transaction_id'])
+    if not transaction or not transaction.is_pending or transaction.mpesa_request_id:
+        logging.warning(f"Skipping STK push job for Tx ID {payload['transaction_id']}: not awaiting a push")
+        return
+
+    try:
+        StkPushService.send(transaction, payload['callback_url'], retries=0)
+    except PaymentOutcomeUnknown as e:
+        # Resending would prompt the tipper again
+        raise UnknownPaymentOutcome(str(e)) from e
+
+def _fail_b2c_payment(job, error):
+    """Mark the withdrawal failed when its payout is dead-lettered"""
+    if isinstance(error, UnknownPaymentOutcome):
+        # Leave it pending for the result callback or manual reconciliation
+        logging.error(f"Withdrawal {job.data.get('withdrawal_id')} left pending: {error}")
+        return
+
+    withdrawal = Withdrawal.query.get(job.data.get('withdrawal_id'))
+    if withdrawal and withdrawal.is_pending and not withdrawal.mpesa_request_id:
+        WithdrawalService.process_withdrawal(
+            withdrawal.id,
+            success=False,
+            failure_reason=str(error)[:255]
+        )
+
+@JobQueue.register('b2c_payment', on_dead=_fail_b2c_payment)
+def run_b2c_payment(payload):
+    """Send a queued B2C payout"""
+    withdrawal = Withdrawal.query.get(payload['withdrawal_id'])
+    if not withdrawal or not withdrawal.is_pending or withdrawal.mpesa_request_id:
+        logging.warning(f"Skipping B2C job for withdrawal {payload['withdrawal_id']}: not awaiting a payout")
+        return
+
+    try:
+        WithdrawalService.send_payout(withdrawal, retries=0)
+    except PaymentOutcomeUnknown as e:
+        # Resending could pay the creator twice
+        raise UnknownPaymentOutcome(str(e)) from e
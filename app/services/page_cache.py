@@ -0,0 +1,116 @@
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+from flask import request, current_app
+from .creator_cache import CreatorCache
+import hashlib
+import threading
+import time
+
+RenderedPage = namedtuple('RenderedPage', ['body', 'etag', 'last_modified', 'creator_id', 'expires'])
+
+class PageCache:
+    """
+    Process-local TTL/LRU cache of rendered public pages
+
+    Pages are keyed by the URL lookup that produced them (a tip link ID or a
+    username) and remember which creator they belong to, so a profile change
+    drops every page of that creator through CreatorCache's invalidation.
+    Only pages that render identically for every visitor may be cached here.
+    """
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+    ttl = 300
+    max_size = 1024
+    max_age = 60
+
+    @classmethod
+    def init_app(cls, app):
+        """
+        Configure cache limits and public max-age from the app config
+
+        Args:
+            app: Flask application
+        """
+        cls.ttl = app.config.get('TIP_PAGE_CACHE_TTL', 300)
+        cls.max_size = app.config.get('TIP_PAGE_CACHE_SIZE', 1024)
+        cls.max_age = app.config.get('TIP_PAGE_MAX_AGE', 60)
+        cls.clear()
+
+    @classmethod
+    def get(cls, key):
+        """
+        Get a cached page
+
+        Returns:
+            RenderedPage: The page, or None on a miss or expiry
+        """
+        with cls._lock:
+            page = cls._entries.get(key)
+            if page is None:
+                return None
+            if page.expires <= time.monotonic():
+                del cls._entries[key]
+                return None
+            cls._entries.move_to_end(key)
+            return page
+
+    @classmethod
+    def put(cls, key, creator_id, body):
+        """
+        Store a rendered page
+
+        Args:
+            key: Cache key for the page
+            creator_id: Creator the page belongs to
+            body: Rendered HTML
+
+        Returns:
+            RenderedPage: The stored page
+        """
+        data = body.encode('utf-8')
+        page = RenderedPage(
+            body=data,
+            etag=hashlib.sha1(data).hexdigest(),
+            # HTTP dates have second precision
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0),
+            creator_id=creator_id,
+            expires=time.monotonic() + cls.ttl
+        )
+        if cls.ttl > 0:
+            with cls._lock:
+                cls._entries[key] = page
+                cls._entries.move_to_end(key)
+                while len(cls._entries) > cls.max_size:
+                    cls._entries.popitem(last=False)
+        return page
+
+    @classmethod
+    def invalidate_creator(cls, creator_id):
+        """Drop every cached page belonging to a creator"""
+        with cls._lock:
+            for key in [key for key, page in cls._entries.items() if page.creator_id == creator_id]:
+                del cls._entries[key]
+
+    @classmethod
+    def clear(cls):
+        """Drop all cached pages"""
+        with cls._lock:
+            cls._entries.clear()
+
+    @classmethod
+    def response(cls, page):
+        """
+        Build a publicly cacheable response for a page
+
+        Answers 304 Not Modified when the request's If-None-Match or
+        If-Modified-Since validators match.
+        """
+        response = current_app.response_class(page.body, mimetype='text/html')
+        response.set_etag(page.etag)
+        response.last_modified = page.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = cls.max_age
+        return response.make_conditional(request)
+
+CreatorCache.add_invalidation_listener(PageCache.invalidate_creator)
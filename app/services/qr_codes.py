@@ -0,0 +1,49 @@
+from functools import lru_cache
+import hashlib
+import io
+import qrcode
+import qrcode.image.svg
+
+QR_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+@lru_cache(maxsize=256)
+def render_qr_code(data, fmt='png', box_size=10, border=4):
+    """
+    Render a QR code image, memoized by content and size
+
+    Tip links are effectively static per creator, so repeated polls are
+    served from memory instead of re-encoding the image.
+
+    Args:
+        data: Text to encode (the tip link)
+        fmt: 'png' or 'svg'
+        box_size: Pixels per module
+        border: Quiet zone width in modules
+
+    Returns:
+        tuple: (image bytes, strong ETag value)
+    """
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Unsupported QR code format: {fmt}")
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    if fmt == 'svg':
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+
+    buffer = io.BytesIO()
+    img.save(buffer)
+    image = buffer.getvalue()
+    return image, hashlib.sha1(image).hexdigest()
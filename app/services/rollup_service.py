@@ -0,0 +1,190 @@
+from .. import db
+from ..models.tip_rollup import TipRollup
+from ..models.transaction import Transaction
+from .db_utils import insert_ignore
+from datetime import datetime, timedelta
+from sqlalchemy import func, update, delete
+import logging
+
+class RollupService:
+    """
+    Hourly and daily completed-tip rollups per creator
+
+    Buckets are keyed by the transaction's created_at and adjusted inside the
+    caller's database transaction, so dashboard statistics cost O(buckets)
+    instead of O(tips).
+    """
+
+    GRANULARITIES = (TipRollup.GRANULARITY_HOUR, TipRollup.GRANULARITY_DAY)
+
+    @staticmethod
+    def bucket_start(timestamp, granularity):
+        """Truncate a timestamp to the start of its bucket"""
+        if granularity == TipRollup.GRANULARITY_HOUR:
+            return timestamp.replace(minute=0, second=0, microsecond=0)
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def _adjust(creator_id, timestamp, count, amount):
+        """Add to the hour and day buckets containing timestamp"""
+        for granularity in RollupService.GRANULARITIES:
+            bucket = RollupService.bucket_start(timestamp, granularity)
+            insert_ignore(TipRollup, {
+                'creator_id': creator_id,
+                'granularity': granularity,
+                'bucket_start': bucket,
+                'tip_count': 0,
+                'tip_amount': 0.0
+            }, index_elements=['creator_id', 'granularity', 'bucket_start'])
+            db.session.execute(
+                update(TipRollup)
+                .where(
+                    TipRollup.creator_id == creator_id,
+                    TipRollup.granularity == granularity,
+                    TipRollup.bucket_start == bucket
+                )
+                .values(
+                    tip_count=TipRollup.tip_count + count,
+                    tip_amount=TipRollup.tip_amount + amount
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+    @staticmethod
+    def record_transaction_status(transaction, old_status):
+        """
+        Reflect a tip status change in the rollups
+
+        Args:
+            transaction: Transaction with its new status set
+            old_status: Status before the change
+        """
+        was_completed = old_status == Transaction.STATUS_COMPLETED
+        is_completed = transaction.status == Transaction.STATUS_COMPLETED
+        if was_completed == is_completed:
+            return
+
+        sign = 1 if is_completed else -1
+        timestamp = transaction.created_at or datetime.utcnow()
+        RollupService._adjust(transaction.creator_id, timestamp, sign, sign * transaction.amount)
+
+    @staticmethod
+    def totals(creator_id, start, end=None):
+        """
+        Sum completed tips in [start, end) using day buckets
+
+        Args:
+            creator_id: ID of the creator
+            start: Start of the range (truncated to a day boundary)
+            end: End of the range (default: now)
+
+        Returns:
+            tuple: (tip_count, tip_amount)
+        """
+        query = db.session.query(
+                func.coalesce(func.sum(TipRollup.tip_count), 0),
+                func.coalesce(func.sum(TipRollup.tip_amount), 0.0)
+            )\
+            .filter(TipRollup.creator_id == creator_id)\
+            .filter(TipRollup.granularity == TipRollup.GRANULARITY_DAY)\
+            .filter(TipRollup.bucket_start >= RollupService.bucket_start(start, TipRollup.GRANULARITY_DAY))
+        if end:
+            query = query.filter(TipRollup.bucket_start < end)
+
+        count, amount = query.one()
+        return count, amount
+
+    @staticmethod
+    def monthly_stats(creator_id, now=None):
+        """
+        Get completed tip totals for the current calendar month
+
+        Returns:
+            dict: monthly_amount, monthly_count and monthly_average
+        """
+        now = now or datetime.utcnow()
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        count, amount = RollupService.totals(creator_id, month_start)
+
+        return {
+            'monthly_amount': amount,
+            'monthly_count': count,
+            'monthly_average': amount / count if count else 0
+        }
+
+    @staticmethod
+    def time_series(creator_id, granularity, start, end=None):
+        """
+        Get per-bucket tip totals with empty buckets filled in
+
+        Args:
+            creator_id: ID of the creator
+            granularity: TipRollup.GRANULARITY_HOUR or GRANULARITY_DAY
+            start: First bucket to include
+            end: End of the range (default: now)
+
+        Returns:
+            list: (bucket_start, tip_count, tip_amount) tuples in order
+        """
+        if granularity not in RollupService.GRANULARITIES:
+            raise ValueError(f"Invalid granularity: {granularity}")
+
+        end = end or datetime.utcnow()
+        start = RollupService.bucket_start(start, granularity)
+        rows = db.session.query(TipRollup.bucket_start, TipRollup.tip_count, TipRollup.tip_amount)\
+            .filter(TipRollup.creator_id == creator_id)\
+            .filter(TipRollup.granularity == granularity)\
+            .filter(TipRollup.bucket_start >= start)\
+            .filter(TipRollup.bucket_start <= end)\
+            .all()
+        buckets = {bucket: (count, amount) for bucket, count, amount in rows}
+
+        step = timedelta(hours=1) if granularity == TipRollup.GRANULARITY_HOUR else timedelta(days=1)
+        series = []
+        bucket = start
+        while bucket <= end:
+            count, amount = buckets.get(bucket, (0, 0.0))
+            series.append((bucket, count, amount))
+            bucket += step
+        return series
+
+    @staticmethod
+    def backfill(creator_id=None, batch_size=10000):
+        """
+        Rebuild rollups from completed transactions
+
+        Args:
+            creator_id: Only rebuild this creator (default all creators)
+            batch_size: Rows fetched per round trip while scanning
+
+        Returns:
+            int: Number of buckets written
+        """
+        delete_stmt = delete(TipRollup)
+        query = db.session.query(Transaction.creator_id, Transaction.created_at, Transaction.amount)\
+            .filter(Transaction.status == Transaction.STATUS_COMPLETED)\
+            .filter(Transaction.created_at.isnot(None))
+        if creator_id:
+            delete_stmt = delete_stmt.where(TipRollup.creator_id == creator_id)
+            query = query.filter(Transaction.creator_id == creator_id)
+
+        buckets = {}
+        for cid, created_at, amount in query.yield_per(batch_size):
+            for granularity in RollupService.GRANULARITIES:
+                key = (cid, granularity, RollupService.bucket_start(created_at, granularity))
+                count, total = buckets.get(key, (0, 0.0))
+                buckets[key] = (count + 1, total + amount)
+
+        db.session.execute(delete_stmt)
+        if buckets:
+            db.session.execute(TipRollup.__table__.insert(), [{
+                'creator_id': cid,
+                'granularity': granularity,
+                'bucket_start': bucket,
+                'tip_count': count,
+                'tip_amount': total
+            } for (cid, granularity, bucket), (count, total) in buckets.items()])
+        db.session.commit()
+
+        logging.info(f"Backfilled {len(buckets)} tip rollup buckets")
+        return len(buckets)
@@ -0,0 +1,39 @@
+from flask import current_app
+from .scheduler import Scheduler
+from .socket_manager import SocketManager
+from .status_reconciler import StatusReconciler
+from .transaction_service import TransactionService
+from .withdrawal_service import WithdrawalService
+
+# Periodic maintenance run by `manage.py run-scheduler` or a scheduler
+# embedded in the job worker. Each task holds a database lease while it
+# runs, so only one process in the fleet executes it at a time.
+
+@Scheduler.register('timeout_stale_transactions', interval=60)
+def timeout_stale_transactions():
+    """Time out STK pushes that were never confirmed"""
+    return TransactionService.timeout_stale_transactions(
+        hours=current_app.config.get('STALE_TRANSACTION_HOURS', 1)
+    )
+
+@Scheduler.register('reconcile_payments', interval=10, lease=300)
+def reconcile_payments():
+    """Settle pending STK pushes by querying M-Pesa"""
+    return StatusReconciler.sweep_from_config(current_app)
+
+@Scheduler.register('prune_parked_callbacks', interval=3600)
+def prune_parked_callbacks():
+    """Drop B2C callbacks that never matched a withdrawal"""
+    return WithdrawalService.prune_parked_callbacks()
+
+@Scheduler.register('prune_stk_callbacks', interval=3600)
+def prune_stk_callbacks():
+    """Drop old STK callback inbox rows"""
+    return TransactionService.prune_stk_callbacks(
+        days=current_app.config.get('STK_CALLBACK_RETENTION_DAYS', 7)
+    )
+
+@Scheduler.register('prune_overlay_events', interval=60)
+def prune_overlay_events():
+    """Trim each creator's overlay event history"""
+    return SocketManager.prune_history()
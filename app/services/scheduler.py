@@ -0,0 +1,174 @@
+from .. import db
+from ..models.scheduler_lease import SchedulerLease
+from .db_utils import insert_ignore, lock_owner
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_
+import logging
+import random
+import threading
+import time
+
+PeriodicTask = namedtuple('PeriodicTask', ['name', 'func', 'interval', 'lease'])
+
+class Scheduler:
+    """
+    Periodic maintenance tasks shared by every process in the fleet
+
+    Any number of schedulers (`manage.py run-scheduler`, or threads embedded
+    in workers) may run the same tasks. Before running a task a scheduler
+    takes the task's scheduler_lease row with a conditional UPDATE that
+    only succeeds once the previous lease has expired and the interval has
+    passed since the last start, so each task runs on one process at a time
+    and about once per interval across the fleet.
+    """
+
+    # name -> PeriodicTask
+    _tasks = {}
+
+    @classmethod
+    def register(cls, name, interval, lease=None):
+        """
+        Register a periodic task
+
+        The task runs inside an app context and must finish within its
+        lease, after which another scheduler may start it again.
+
+        Args:
+            name: Unique task name, also the lease row key
+            interval: Seconds between runs
+            lease: Seconds the lease is held (default twice the interval, at least a minute)
+        """
+        def decorator(func):
+            cls._tasks[name] = PeriodicTask(name, func, interval, lease or max(60, 2 * interval))
+            return func
+        return decorator
+
+    @classmethod
+    def acquire(cls, task, owner):
+        """
+        Take a task's lease if it is free and the task is due
+
+        Returns:
+            bool: True if this owner may run the task now
+        """
+        now = datetime.utcnow()
+        insert_ignore(SchedulerLease, {
+            'name': task.name,
+            'locked_until': now
+        }, index_elements=['name'])
+
+        acquired = db.session.execute(
+            update(SchedulerLease)
+            .where(
+                SchedulerLease.name == task.name,
+                SchedulerLease.locked_until <= now,
+                or_(
+                    SchedulerLease.last_started_at.is_(None),
+                    SchedulerLease.last_started_at <= now - timedelta(seconds=task.interval)
+                )
+            )
+            .values(
+                locked_by=owner,
+                locked_until=now + timedelta(seconds=task.lease),
+                last_started_at=now
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        db.session.commit()
+        return acquired
+
+    @classmethod
+    def release(cls, task, owner, error=None):
+        """Give up a task's lease after a run"""
+        now = datetime.utcnow()
+        db.session.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == task.name, SchedulerLease.locked_by == owner)
+            .values(
+                locked_until=now,
+                last_finished_at=now,
+                last_error=str(error)[:500] if error else None
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    @classmethod
+    def run_task(cls, task, owner):
+        """
+        Run a task if this owner can take its lease
+
+        Returns:
+            bool: True if the task ran
+        """
+        if not cls.acquire(task, owner):
+            return False
+
+        started = time.monotonic()
+        error = None
+        try:
+            result = task.func()
+            logging.info(f"Scheduled task {task.name} finished in {time.monotonic() - started:.2f}s: {result}")
+        except Exception as e:
+            db.session.rollback()
+            error = e
+            logging.error(f"Scheduled task {task.name} failed: {str(e)}", exc_info=True)
+
+        cls.release(task, owner, error)
+        return True
+
+    @classmethod
+    def run(cls, app, tick=1.0, jitter=0.1, names=None, once=False):
+        """
+        Run due tasks until interrupted
+
+        Each task's next local attempt is pushed back by up to jitter times
+        its interval, so schedulers started together do not stampede.
+
+        Args:
+            app: Flask application
+            tick: Seconds between checks for due tasks
+            jitter: Fraction of the interval added at random to each wait
+            names: Only run these tasks (default all registered)
+            once: Try every task a single time and return
+
+        Returns:
+            int: Number of task runs
+        """
+        owner = lock_owner(threading.get_ident())
+        tasks = [task for name, task in cls._tasks.items() if not names or name in names]
+        next_run = {task.name: time.monotonic() + random.uniform(0, jitter * task.interval) for task in tasks}
+        if once:
+            next_run = dict.fromkeys(next_run, 0)
+        runs = 0
+        logging.info(f"Scheduler {owner} started with tasks: {', '.join(next_run)}")
+
+        while True:
+            for task in tasks:
+                if time.monotonic() < next_run[task.name]:
+                    continue
+
+                with app.app_context():
+                    try:
+                        runs += cls.run_task(task, owner)
+                    except Exception as e:
+                        db.session.rollback()
+                        logging.error(f"Scheduler could not run {task.name}: {str(e)}")
+                next_run[task.name] = time.monotonic() + task.interval * (1 + random.uniform(0, jitter))
+
+            if once:
+                return runs
+            time.sleep(tick)
+
+    @classmethod
+    def start_background(cls, app, **kwargs):
+        """
+        Run the scheduler in a daemon thread of the current process
+
+        Returns:
+            threading.Thread: The scheduler thread
+        """
+        thread = threading.Thread(target=cls.run, args=(app,), kwargs=kwargs, name='scheduler', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,89 @@
+import socketio
+import sqlite3
+import threading
+import time
+
+class SQLiteManager(socketio.PubSubManager):
+    """
+    Socket.IO client manager that fans out events through a SQLite file
+
+    A local stand-in for Redis/AMQP when several worker processes on one
+    host (or a test run) need to share events: each process appends
+    published messages to a table and polls it for messages from the
+    others. Selected with SOCKETIO_MESSAGE_QUEUE=sqlite:///path/to/bus.sqlite.
+
+    Args:
+        url: sqlite:/// URL of the bus database file
+        channel: Channel name, so several apps can share one file
+        write_only: Only publish, never start the listener thread
+        poll_interval: Seconds between polls for new messages
+        retention: Seconds to keep delivered messages before pruning
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///socketio_bus.sqlite', channel='socketio', write_only=False,
+                 logger=None, json=None, poll_interval=0.1, retention=60):
+        if not url.startswith('sqlite:///'):
+            raise ValueError(f"Invalid SQLite message queue URL: {url}")
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = url[len('sqlite:///'):]
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._last_prune = 0.0
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS socketio_message (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+
+    def _connection(self):
+        """Per-thread connection; sqlite3 connections are not shareable"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            # WAL lets the listeners read while another process appends
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _publish(self, data):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            'INSERT INTO socketio_message (channel, payload, created_at) VALUES (?, ?, ?)',
+            (self.channel, self.json.dumps(data), now)
+        )
+
+        # Listeners poll every poll_interval, so old rows are never needed
+        if now - self._last_prune > self.retention:
+            self._last_prune = now
+            conn.execute('DELETE FROM socketio_message WHERE created_at < ?', (now - self.retention,))
+
+    def _sleep(self, seconds):
+        if self.server:
+            self.server.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _listen(self):
+        conn = self._connection()
+        # Only deliver messages published after this process started listening
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_message').fetchone()[0]
+        while True:
+            rows = conn.execute(
+                'SELECT id, payload FROM socketio_message WHERE id > ? AND channel = ? ORDER BY id',
+                (last_id, self.channel)
+            ).fetchall()
+            for row_id, payload in rows:
+                last_id = row_id
+                yield payload
+            if not rows:
+                self._sleep(self.poll_interval)
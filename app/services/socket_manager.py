@@ -1,12 +1,113 @@
-from .. import socketio
-from flask_socketio import join_room, leave_room
+from .. import db, socketio
+from ..models.overlay_event import OverlayEvent
+from .event_stream import EventStream
+from flask import current_app, session
+from flask_socketio import join_room, leave_room, emit
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import insert, select, delete, exists, func
+import atexit
+import json
 import logging
+import threading
 
 class SocketManager:
     """
     Socket manager to handle WebSocket events
+    
+    With SOCKETIO_BATCH_WINDOW_MS set, events for a room are coalesced over
+    the window and sent as one 'tips_batch' frame ({'events': [{'event',
+    'data'}, ...]}, in emit order). A tip_status for a transaction replaces
+    any earlier buffered status for it, and a room's buffer is flushed
+    early once it holds SOCKETIO_BATCH_MAX_EVENTS events.
+    
+    Every new_tip and tip_status carries a 'seq' number and at least the
+    last OVERLAY_EVENT_HISTORY events per creator are kept (the
+    prune_overlay_events task trims the excess in bulk), so an
+    authenticated client rejoining with its last seen seq receives only
+    what it missed.
+    
+    Only the creator's own session or overlay token may join a creator's
+    room. A tipper's page instead watches its one transaction through a
+    transaction room, using the status token returned when the tip was
+    initiated.
     """
     
+    # Never recorded or sent to any room
+    PRIVATE_FIELDS = ('phone_number',)
+    
+    _batch_window = 0
+    _batch_max_events = 100
+    _history = 200
+    _buffers = {}
+    _buffer_lock = threading.Lock()
+    
+    @classmethod
+    def init_app(cls, app):
+        """
+        Configure event batching from the app config
+        
+        Args:
+            app: Flask application
+        """
+        cls._batch_window = app.config.get('SOCKETIO_BATCH_WINDOW_MS', 0) / 1000.0
+        cls._batch_max_events = app.config.get('SOCKETIO_BATCH_MAX_EVENTS', 100)
+        cls._history = app.config.get('OVERLAY_EVENT_HISTORY', 200)
+        if cls._batch_window:
+            # Short-lived CLI processes must not exit with events still buffered
+            atexit.register(cls.flush_all)
+    
+    @classmethod
+    def _emit(cls, event, data, room):
+        """
+        Emit an event to a room, buffering it when batching is enabled
+        """
+        if not cls._batch_window:
+            socketio.emit(event, data, room=room)
+            return
+        
+        schedule = flush_now = False
+        with cls._buffer_lock:
+            buffer = cls._buffers.get(room)
+            if buffer is None:
+                buffer = cls._buffers[room] = []
+                schedule = True
+            if event == 'tip_status':
+                # Only the latest status of a transaction is worth sending
+                buffer[:] = [e for e in buffer
+                             if e['event'] != 'tip_status' or e['data'].get('id') != data.get('id')]
+            buffer.append({'event': event, 'data': data})
+            flush_now = len(buffer) >= cls._batch_max_events
+        
+        if flush_now:
+            cls._flush(room)
+        elif schedule:
+            socketio.start_background_task(cls._flush_later, room)
+    
+    @classmethod
+    def _flush_later(cls, room):
+        socketio.sleep(cls._batch_window)
+        cls._flush(room)
+    
+    @classmethod
+    def _flush(cls, room):
+        """Send a room's buffered events"""
+        with cls._buffer_lock:
+            buffer = cls._buffers.pop(room, None)
+        if not buffer:
+            return
+        
+        if len(buffer) == 1:
+            socketio.emit(buffer[0]['event'], buffer[0]['data'], room=room)
+        else:
+            socketio.emit('tips_batch', {'events': buffer}, room=room)
+        logging.debug(f"Flushed {len(buffer)} buffered events to room {room}")
+    
+    @classmethod
+    def flush_all(cls):
+        """Send every room's buffered events now"""
+        for room in list(cls._buffers):
+            cls._flush(room)
+    
     @classmethod
     def handle_connect(cls, creator_id=None):
         """
@@ -47,6 +148,178 @@ class SocketManager:
         leave_room(room)
         logging.debug(f"Left room: {room}")
     
+    @classmethod
+    def join_transaction_room(cls, transaction_id):
+        """
+        Join a transaction's room for receiving its status updates
+        """
+        room = f'transaction_{transaction_id}'
+        join_room(room)
+        logging.debug(f"Joined room: {room}")
+    
+    @classmethod
+    def overlay_token(cls, creator_id):
+        """
+        Signed token that lets an overlay without a login session replay events
+        
+        Args:
+            creator_id: The ID of the creator
+        """
+        return URLSafeSerializer(current_app.secret_key, salt='overlay-events').dumps(int(creator_id))
+    
+    @classmethod
+    def can_replay(cls, creator_id, token=None):
+        """
+        Check if the current socket client may receive and replay a creator's events
+        
+        Either the client's login session belongs to the creator or it
+        presents the creator's overlay token.
+        """
+        try:
+            creator_id = int(creator_id)
+        except (TypeError, ValueError):
+            return False
+            
+        if session.get('creator_id') == creator_id:
+            return True
+        if not token:
+            return False
+        try:
+            return URLSafeSerializer(current_app.secret_key, salt='overlay-events').loads(token) == creator_id
+        except BadSignature:
+            return False
+    
+    @classmethod
+    def status_token(cls, transaction_id):
+        """
+        Signed token that lets a tipper's page watch one transaction's status
+        
+        Args:
+            transaction_id: The ID of the transaction
+        """
+        return URLSafeSerializer(current_app.secret_key, salt='tip-status').dumps(int(transaction_id))
+    
+    @classmethod
+    def can_watch(cls, transaction_id, token):
+        """Check if a status token was issued for a transaction"""
+        try:
+            transaction_id = int(transaction_id)
+        except (TypeError, ValueError):
+            return False
+            
+        if not token:
+            return False
+        try:
+            return URLSafeSerializer(current_app.secret_key, salt='tip-status').loads(token) == transaction_id
+        except BadSignature:
+            return False
+    
+    @classmethod
+    def _record(cls, creator_id, event, data):
+        """
+        Append an event to the creator's history and stamp its sequence number
+        
+        A single INSERT on its own connection, so the caller's session is
+        left untouched; old events are trimmed later by prune_history.
+        PRIVATE_FIELDS are dropped before the event is stored.
+        
+        Returns:
+            dict: Copy of data without PRIVATE_FIELDS and with 'seq' set
+        """
+        data = {key: value for key, value in data.items() if key not in cls.PRIVATE_FIELDS}
+        try:
+            with db.engine.begin() as conn:
+                seq = conn.execute(insert(OverlayEvent.__table__).values(
+                    creator_id=creator_id,
+                    event=event,
+                    payload=json.dumps(data)
+                )).inserted_primary_key[0]
+            data['seq'] = seq
+            EventStream.notify()
+        except Exception as e:
+            # Live delivery matters more than replayability
+            logging.error(f"Error recording {event} event for creator {creator_id}: {str(e)}")
+        return data
+    
+    @classmethod
+    def prune_history(cls):
+        """
+        Trim every creator's history to the newest OVERLAY_EVENT_HISTORY events
+        
+        One set-based DELETE for all creators, run periodically instead of
+        on every recorded event.
+        
+        Returns:
+            int: Number of events removed
+        """
+        ranked = select(
+            OverlayEvent.id,
+            func.row_number().over(
+                partition_by=OverlayEvent.creator_id,
+                order_by=OverlayEvent.id.desc()
+            ).label('position')
+        ).subquery()
+        removed = db.session.execute(
+            delete(OverlayEvent)
+            .where(OverlayEvent.id.in_(select(ranked.c.id).where(ranked.c.position > cls._history)))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return removed
+    
+    @classmethod
+    def replay(cls, creator_id, last_seq):
+        """
+        Get a creator's events after a sequence number
+        
+        Args:
+            creator_id: The ID of the creator
+            last_seq: Last sequence number the client saw
+            
+        Returns:
+            tuple: (events as {'event', 'data'} dicts, truncated) where
+            truncated means older events were already trimmed from history
+        """
+        rows = OverlayEvent.query\
+            .filter(OverlayEvent.creator_id == creator_id)\
+            .filter(OverlayEvent.id > last_seq)\
+            .order_by(OverlayEvent.id)\
+            .limit(cls._history + 1)\
+            .all()
+        
+        # History can run past the limit between prunes; never send a partial gap
+        overflowed = len(rows) > cls._history
+        rows = rows[:cls._history]
+        
+        # If nothing at or before last_seq survives, part of the gap may be gone
+        retained = db.session.query(exists().where(
+            OverlayEvent.creator_id == creator_id,
+            OverlayEvent.id <= last_seq
+        )).scalar()
+        truncated = overflowed or (not retained and len(rows) >= cls._history)
+        
+        events = []
+        for row in rows:
+            data = row.data
+            data['seq'] = row.id
+            events.append({'event': row.event, 'data': data})
+        return events, truncated
+    
+    @classmethod
+    def send_replay(cls, creator_id, last_seq):
+        """
+        Send the current socket client the events it missed as one tips_batch frame
+        """
+        try:
+            last_seq = int(last_seq)
+        except (TypeError, ValueError):
+            return
+            
+        events, truncated = cls.replay(int(creator_id), last_seq)
+        if events or truncated:
+            emit('tips_batch', {'events': events, 'replay': True, 'truncated': truncated})
+        logging.debug(f"Replayed {len(events)} events for creator {creator_id} after seq {last_seq}")
+    
     @classmethod
     def emit_new_tip(cls, creator_id, tip_data):
         """
@@ -57,7 +330,8 @@ class SocketManager:
             tip_data: Dictionary with tip details (name, amount, message)
         """
         room = f'creator_{creator_id}'
-        socketio.emit('new_tip', tip_data, room=room)
+        tip_data = cls._record(creator_id, 'new_tip', tip_data)
+        cls._emit('new_tip', tip_data, room)
         logging.debug(f"Emitted new_tip event to room {room}: {tip_data}")
     
     @classmethod
@@ -81,14 +355,39 @@ class SocketManager:
             data.update({
                 'mpesa_receipt': transaction.mpesa_receipt,
                 'amount': float(transaction.amount),  # Ensure amount is serializable
-                'phone_number': transaction.phone_number,
                 'timestamp': transaction.updated_at.strftime('%Y-%m-%d %H:%M:%S') if transaction.updated_at else None,
                 'tipper_name': transaction.tipper_name,
                 'message': transaction.message
             })
             
-        socketio.emit('tip_status', data, room=room)
+        data = cls._record(creator_id, 'tip_status', data)
+        cls._emit('tip_status', data, room)
         logging.debug(f"Emitted tip_status event to room {room}: {data}")
+        
+        # The tipper only needs what its receipt shows
+        receipt_fields = ('id', 'status', 'mpesa_receipt', 'amount', 'timestamp')
+        cls._emit('tip_status', {key: data[key] for key in receipt_fields if key in data},
+                  f'transaction_{transaction_id}')
+
+    @classmethod
+    def emit_tip_statuses(cls, creator_id, transaction_ids, status):
+        """
+        Emit one status for many transactions as a single tips_batch frame
+        
+        Used by bulk updates so a large sweep costs one recorded event and
+        one frame per creator instead of one per transaction.
+        
+        Args:
+            creator_id: The ID of the creator
+            transaction_ids: IDs of the transactions
+            status: The new status shared by all of them
+        """
+        room = f'creator_{creator_id}'
+        events = [{'event': 'tip_status', 'data': {'id': transaction_id, 'status': status}}
+                  for transaction_id in transaction_ids]
+        data = cls._record(creator_id, 'tips_batch', {'events': events})
+        socketio.emit('tips_batch', data, room=room)
+        logging.debug(f"Emitted {len(events)} tip_status events to room {room}")
 
 # Register socket events
 @socketio.on('connect')
@@ -103,11 +402,27 @@ def handle_disconnect():
 def handle_join(data):
     """
     Handle join room event
-    Expected data: {'creator_id': id}
+    Expected data: {'creator_id': id, 'last_seq': seq (optional), 'token': overlay token (optional)}
+    or {'transaction_id': id, 'token': status token} from a tipper's page
     """
+    transaction_id = data.get('transaction_id')
+    if transaction_id:
+        if SocketManager.can_watch(transaction_id, data.get('token')):
+            SocketManager.join_transaction_room(transaction_id)
+        else:
+            logging.warning(f"Rejected join for transaction {transaction_id}: invalid status token")
+        return
+        
     creator_id = data.get('creator_id')
     if creator_id:
+        if not SocketManager.can_replay(creator_id, data.get('token')):
+            logging.warning(f"Rejected join for creator {creator_id}: not the creator's session or overlay token")
+            return
         SocketManager.join_creator_room(creator_id)
+        
+        # Reconnecting clients catch up on what they missed
+        if data.get('last_seq') is not None:
+            SocketManager.send_replay(creator_id, data['last_seq'])
 
 @socketio.on('leave')
 def handle_leave(data):
@@ -0,0 +1,124 @@
+from flask import current_app
+from .. import db
+from ..models.transaction import Transaction
+from .transaction_service import TransactionService
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_
+import logging
+import time
+
+class StatusReconciler:
+    """Background sweeper that settles pending STK pushes by querying M-Pesa"""
+
+    @classmethod
+    def _due(cls, cooldown_cutoff):
+        """Filter for transactions not queried within the cooldown"""
+        return or_(
+            Transaction.status_checked_at.is_(None),
+            Transaction.status_checked_at <= cooldown_cutoff
+        )
+
+    @classmethod
+    def sweep(cls, limit=50, cooldown=30, rate=5.0, min_age=15, max_age_hours=24):
+        """
+        Query M-Pesa for a batch of pending transactions
+        
+        Args:
+            limit: Maximum number of transactions queried per sweep
+            cooldown: Seconds before the same transaction is queried again
+            rate: Maximum M-Pesa queries per second
+            min_age: Seconds to give the callback a chance before querying
+            max_age_hours: Ignore pending transactions older than this
+            
+        Returns:
+            dict: Counts of queried, completed, failed and errored transactions
+        """
+        now = datetime.utcnow()
+        cooldown_cutoff = now - timedelta(seconds=cooldown)
+
+        candidates = db.session.query(Transaction.id)\
+            .filter(Transaction.status == Transaction.STATUS_PENDING)\
+            .filter(Transaction.mpesa_request_id.isnot(None))\
+            .filter(Transaction.created_at <= now - timedelta(seconds=min_age))\
+            .filter(Transaction.created_at >= now - timedelta(hours=max_age_hours))\
+            .filter(cls._due(cooldown_cutoff))\
+            .order_by(Transaction.created_at)\
+            .limit(limit)\
+            .all()
+
+        stats = {'queried': 0, 'completed': 0, 'failed': 0, 'errors': 0}
+        mpesa = current_app.mpesa
+        interval = 1.0 / rate if rate else 0
+
+        for (transaction_id,) in candidates:
+            # Claim the cooldown slot so concurrent sweepers skip this transaction
+            claimed = db.session.execute(
+                update(Transaction)
+                .where(
+                    Transaction.id == transaction_id,
+                    Transaction.status == Transaction.STATUS_PENDING,
+                    cls._due(cooldown_cutoff)
+                )
+                .values(status_checked_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if claimed != 1:
+                continue
+
+            transaction = Transaction.query.get(transaction_id)
+            started = time.monotonic()
+            try:
+                response = mpesa.query_transaction(transaction.mpesa_request_id)
+                status = TransactionService.apply_status_query(transaction, response)
+                stats['queried'] += 1
+                if status == Transaction.STATUS_COMPLETED:
+                    stats['completed'] += 1
+                elif status == Transaction.STATUS_FAILED:
+                    stats['failed'] += 1
+            except Exception as e:
+                db.session.rollback()
+                stats['errors'] += 1
+                logging.warning(f"Status query failed for Tx ID {transaction_id}: {str(e)}")
+
+            # Stay under the configured M-Pesa query rate
+            elapsed = time.monotonic() - started
+            if interval > elapsed:
+                time.sleep(interval - elapsed)
+
+        if candidates:
+            logging.info(f"Status reconciler sweep: {stats}")
+        return stats
+
+    @classmethod
+    def sweep_from_config(cls, app):
+        """Run one sweep with the limits configured on the app"""
+        return cls.sweep(
+            limit=app.config.get('MPESA_RECONCILE_BATCH', 50),
+            cooldown=app.config.get('MPESA_RECONCILE_COOLDOWN', 30),
+            rate=app.config.get('MPESA_RECONCILE_RATE', 5.0)
+        )
+
+    @classmethod
+    def run(cls, app, interval=10, once=False):
+        """
+        Sweep pending transactions until interrupted
+        
+        Args:
+            app: Flask application
+            interval: Seconds between sweeps
+            once: Run a single sweep and return
+        """
+        logging.info("Status reconciler started")
+        while True:
+            with app.app_context():
+                try:
+                    stats = cls.sweep_from_config(app)
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Status reconciler sweep failed: {str(e)}", exc_info=True)
+                    stats = None
+
+            if once:
+                return stats
+            time.sleep(interval)
@@ -0,0 +1,162 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from ..models.transaction import Transaction
+from .mpesa import PaymentOutcomeUnknown
+from .transaction_service import TransactionService
+import logging
+import threading
+
+class StkPushService:
+    """Service for initiating M-Pesa STK pushes inline or on a background worker pool"""
+
+    _executor = None
+    _slots = None
+
+    @classmethod
+    def init_app(cls, app):
+        """
+        Set up the bounded worker pool used in async initiation mode
+
+        Args:
+            app: Flask application
+        """
+        if app.config.get('MPESA_STK_MODE', 'sync') != 'async':
+            return
+
+        workers = app.config.get('MPESA_STK_WORKERS', 4)
+        queue_size = app.config.get('MPESA_STK_QUEUE_SIZE', 100)
+
+        # The semaphore bounds queued + running pushes; the executor queue itself is unbounded
+        cls._slots = threading.BoundedSemaphore(workers + queue_size)
+        cls._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stk-push')
+        logging.info(f"STK push worker pool started: {workers} workers, {queue_size} queued")
+
+    @classmethod
+    def is_async(cls):
+        """Check if STK pushes are dispatched to the worker pool"""
+        return cls._executor is not None
+
+    @classmethod
+    def submit(cls, transaction_id, callback_url):
+        """
+        Queue an STK push for a persisted transaction
+
+        Args:
+            transaction_id: ID of the pending transaction
+            callback_url: URL for M-Pesa to send payment notification
+
+        Returns:
+            bool: False if the worker pool is saturated
+        """
+        if not cls._slots.acquire(blocking=False):
+            logging.warning(f"STK push pool saturated, rejecting Tx ID {transaction_id}")
+            return False
+
+        app = current_app._get_current_object()
+        try:
+            cls._executor.submit(cls._run, app, transaction_id, callback_url)
+        except Exception:
+            cls._slots.release()
+            raise
+
+        logging.debug(f"Queued STK push for Tx ID {transaction_id}")
+        return True
+
+    @classmethod
+    def _run(cls, app, transaction_id, callback_url):
+        """Execute a queued STK push inside an application context"""
+        try:
+            with app.app_context():
+                transaction = Transaction.query.get(transaction_id)
+                if not transaction or not transaction.is_pending:
+                    logging.warning(f"Skipping queued STK push for Tx ID {transaction_id}: not pending")
+                    return
+                cls.initiate(transaction, callback_url)
+        except Exception as e:
+            logging.error(f"Queued STK push failed for Tx ID {transaction_id}: {e}", exc_info=True)
+        finally:
+            cls._slots.release()
+
+    @classmethod
+    def initiate(cls, transaction, callback_url):
+        """
+        Send the STK push for a transaction and record the outcome
+
+        Status changes go through TransactionService so socket listeners
+        receive the result regardless of which thread performed the push.
+
+        Args:
+            transaction: The pending transaction
+            callback_url: URL for M-Pesa to send payment notification
+
+        Returns:
+            dict: Outcome with 'result' of completed, pending or failed
+        """
+        try:
+            return cls.send(transaction, callback_url)
+        except PaymentOutcomeUnknown as e:
+            # The prompt may be on the tipper's phone; failing the tip now could
+            # orphan a payment, so it stays pending until it is settled or timed out
+            logging.error(f"STK push outcome unknown for Tx ID {transaction.id}: {e}")
+            return {'result': 'pending', 'transaction': transaction, 'checkout_request_id': None}
+        except Exception as e:
+            logging.error(f"Error initiating M-Pesa payment for Tx ID {transaction.id}: {e}", exc_info=True)
+            TransactionService.update_transaction_status(transaction.id, Transaction.STATUS_FAILED)
+            # Provide a more generic error message to the client
+            return {'result': 'failed', 'transaction': transaction, 'message': 'Could not initiate payment with provider'}
+
+    @classmethod
+    def send(cls, transaction, callback_url, retries=2):
+        """
+        Send the STK push and apply M-Pesa's answer to the transaction
+
+        Unlike initiate, network and API errors are raised to the caller
+        so the job queue can retry them. PaymentOutcomeUnknown means a
+        prompt may have been sent and the push must not be repeated.
+
+        Args:
+            transaction: The pending transaction
+            callback_url: URL for M-Pesa to send payment notification
+            retries: Client-level retries of safe failures (0 under the job queue)
+
+        Returns:
+            dict: Outcome with 'result' of completed, pending or failed
+        """
+        mpesa = current_app.mpesa
+        response = mpesa.stk_push(
+            phone_number=transaction.phone_number,
+            amount=int(transaction.amount), # Ensure amount is integer for M-Pesa
+            callback_url=callback_url,
+            account_reference=f"TIP{transaction.id}",
+            transaction_desc=f"Tip for creator {transaction.creator_id}", # Use ID for consistency
+            retries=retries
+        )
+
+        # Handle test mode response directly from MpesaClient
+        if response.get('test_mode'):
+            logging.info(f"M-Pesa Test Mode response for Tx ID {transaction.id}")
+            transaction = TransactionService.process_successful_payment(
+                transaction,
+                receipt_number=f'TEST-{transaction.id}',
+                phone_number=transaction.phone_number
+            )
+            return {'result': 'completed', 'transaction': transaction, 'test_mode': True}
+
+        # Handle real M-Pesa response
+        checkout_request_id = response.get('CheckoutRequestID')
+        mpesa_response_code = response.get('ResponseCode') # Check M-Pesa specific response code
+
+        if mpesa_response_code == '0' and checkout_request_id:
+            logging.info(f"M-Pesa STK Push accepted for Tx ID {transaction.id}, CheckoutReqID: {checkout_request_id}")
+            transaction = TransactionService.update_transaction_status(
+                transaction.id,
+                Transaction.STATUS_PENDING,
+                mpesa_request_id=checkout_request_id
+            )
+            return {'result': 'pending', 'transaction': transaction, 'checkout_request_id': checkout_request_id}
+
+        # M-Pesa rejected the request before STK Push
+        error_message = response.get('errorMessage', 'M-Pesa rejected the STK push request.')
+        logging.error(f"M-Pesa STK Push initiation failed for Tx ID {transaction.id}. Response: {response}")
+        TransactionService.update_transaction_status(transaction.id, Transaction.STATUS_FAILED)
+        return {'result': 'failed', 'transaction': transaction, 'message': error_message}
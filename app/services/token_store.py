@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+class FileTokenStore:
+    """
+    Share the M-Pesa OAuth token between worker processes through a JSON file
+
+    The file lives in the instance folder so every gunicorn worker started from
+    the same deployment reuses one token instead of requesting its own.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def load(self):
+        """
+        Read the shared token
+
+        Returns:
+            tuple: (token, expiry timestamp) or (None, None) if nothing is stored
+        """
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            return data.get('access_token'), data.get('expires_at')
+        except FileNotFoundError:
+            return None, None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read M-Pesa token store {self.path}: {str(e)}")
+            return None, None
+
+    def save(self, token, expires_at):
+        """Atomically replace the shared token"""
+        directory = os.path.dirname(self.path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.mpesa_token')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'access_token': token, 'expires_at': expires_at}, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not write M-Pesa token store {self.path}: {str(e)}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    @contextmanager
+    def refresh_lock(self):
+        """Hold an exclusive cross-process lock while a token is being fetched"""
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
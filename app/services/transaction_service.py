@@ -1,12 +1,20 @@
 from .. import db, socketio
 from ..models.transaction import Transaction
 from ..models.user import Creator
+from ..models.stk_callback import StkCallback
 from .socket_manager import SocketManager
+from .balance_ledger import BalanceLedger
+from .rollup_service import RollupService
+from .db_utils import keyset_page, insert_ignore
 import logging
 from datetime import datetime, timedelta
+from sqlalchemy import func, update, select, delete, case
 from sqlalchemy.exc import IntegrityError
 import random
 
+# Columns serialized by the transaction listing endpoints
+LISTING_COLUMNS = ('id', 'amount', 'status', 'tipper_name', 'message', 'created_at')
+
 class TransactionService:
     """Service for handling transactions and payments"""
     
@@ -82,6 +90,7 @@ class TransactionService:
             if mpesa_request_id:
                 transaction.mpesa_request_id = mpesa_request_id
                 
+            cls._record_status_change(transaction, old_status)
             db.session.commit()
             
             # Emit socket events
@@ -95,6 +104,161 @@ class TransactionService:
             logging.error(f"Error updating transaction {transaction_id}: {str(e)}")
             raise
 
+    @classmethod
+    def _record_status_change(cls, transaction, old_status):
+        """
+        Update derived balance and rollup rows for a status change
+        
+        Must run before the commit so the derived rows change atomically
+        with the transaction itself.
+        """
+        BalanceLedger.record_transaction_status(transaction, old_status)
+        RollupService.record_transaction_status(transaction, old_status)
+
+    @classmethod
+    def _claim_pending(cls, transaction, status):
+        """
+        Move a pending transaction to a final status in one conditional UPDATE
+        
+        The callback and the status reconciler may settle the same
+        transaction concurrently; only the caller whose UPDATE matches the
+        pending row may credit balances and emit events.
+        
+        Returns:
+            bool: True if this caller moved the transaction out of pending
+        """
+        claimed = db.session.execute(
+            update(Transaction)
+            .where(
+                Transaction.id == transaction.id,
+                Transaction.status == Transaction.STATUS_PENDING
+            )
+            .values(status=status, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        
+        if not claimed:
+            # Keep whatever else the caller staged (e.g. the callback inbox row)
+            db.session.commit()
+            db.session.refresh(transaction)
+            logging.info(f"Tx ID {transaction.id} already settled as {transaction.status}, skipping {status}")
+        return claimed
+
+    @classmethod
+    def handle_stk_callback(cls, checkout_request_id, result_code, result_desc=None, mpesa_receipt=None):
+        """
+        Settle a pending transaction from an STK push callback exactly once
+        
+        The callback is first recorded in the stk_callback inbox with an
+        insert-or-ignore, so a retried delivery is rejected by one indexed
+        statement. The transaction is then settled by one conditional
+        UPDATE on its mpesa_request_id that returns the columns the ledger
+        needs; the ORM row is only loaded afterwards to emit events.
+        
+        Args:
+            checkout_request_id: CheckoutRequestID from the callback
+            result_code: M-Pesa ResultCode (0 for success)
+            result_desc: M-Pesa ResultDesc
+            mpesa_receipt: Receipt number for successful payments
+            
+        Returns:
+            Transaction: The settled transaction, or None for duplicates,
+            unknown requests and transactions that were no longer pending
+        """
+        if not insert_ignore(StkCallback, {
+            'checkout_request_id': checkout_request_id,
+            'result_code': result_code,
+            'result_desc': (result_desc or '')[:255],
+            'mpesa_receipt': mpesa_receipt,
+            'received_at': datetime.utcnow()
+        }, index_elements=['checkout_request_id']):
+            db.session.rollback()
+            logging.info(f"Duplicate M-Pesa callback for CheckoutRequestID {checkout_request_id} ignored")
+            return None
+
+        success = result_code == 0
+        values = {'status': Transaction.STATUS_COMPLETED if success else Transaction.STATUS_FAILED,
+                  'updated_at': datetime.utcnow()}
+        if success:
+            values['mpesa_receipt'] = mpesa_receipt or cls.generate_mpesa_receipt_number()
+        elif result_desc:
+            values['message'] = case(
+                (func.coalesce(Transaction.message, '') == '', f"Failed: {result_desc}"),
+                else_=Transaction.message + f" (Failed: {result_desc})"
+            )
+
+        settled = cls._settle_by_request_id(checkout_request_id, values)
+        if settled is None:
+            known = db.session.execute(
+                select(Transaction.id, Transaction.status)
+                .where(Transaction.mpesa_request_id == checkout_request_id)
+            ).first()
+            if not known:
+                # Drop the inbox row so a retry after the request ID is stamped still counts.
+                # A push whose outcome was unknown never learned its ID; keep enough to reconcile by hand
+                db.session.rollback()
+                logging.error(f"Transaction not found for CheckoutRequestID: {checkout_request_id} "
+                              f"(ResultCode: {result_code}, receipt: {mpesa_receipt})")
+                return None
+
+            db.session.commit()
+            logging.warning(f"Received callback for already processed Tx ID {known.id} (status: {known.status}). Ignoring.")
+            return None
+
+        # Ledger and rollups commit together with the settlement and the inbox row
+        cls._record_status_change(settled, Transaction.STATUS_PENDING)
+        db.session.commit()
+
+        transaction = db.session.get(Transaction, settled.id)
+        if success:
+            logging.info(f"M-Pesa callback success for Tx ID {transaction.id}. Receipt: {transaction.mpesa_receipt}")
+            cls._emit_transaction_events(transaction, Transaction.STATUS_PENDING)
+        else:
+            logging.warning(f"M-Pesa callback failure for Tx ID {transaction.id}. Code: {result_code}, Desc: {result_desc}")
+            SocketManager.emit_tip_status(transaction.creator_id, transaction.id, 'failed')
+        return transaction
+
+    @classmethod
+    def _settle_by_request_id(cls, mpesa_request_id, values):
+        """
+        Move the pending transaction with an M-Pesa request ID to a final status
+        
+        Returns:
+            Row: id, creator_id, amount, status and created_at of the settled
+            transaction, or None if no pending transaction matched
+        """
+        stmt = update(Transaction)\
+            .where(
+                Transaction.mpesa_request_id == mpesa_request_id,
+                Transaction.status == Transaction.STATUS_PENDING
+            )\
+            .values(**values)\
+            .execution_options(synchronize_session=False)
+        columns = (Transaction.id, Transaction.creator_id, Transaction.amount, Transaction.status, Transaction.created_at)
+
+        if db.session.get_bind().dialect.update_returning:
+            return db.session.execute(stmt.returning(*columns)).first()
+
+        # No UPDATE ... RETURNING (e.g. MySQL): read the row back by the same index
+        if db.session.execute(stmt).rowcount != 1:
+            return None
+        return db.session.execute(select(*columns).where(Transaction.mpesa_request_id == mpesa_request_id)).first()
+
+    @classmethod
+    def prune_stk_callbacks(cls, days=7):
+        """
+        Drop inbox rows for callbacks too old to be retried
+        
+        Returns:
+            int: Number of callbacks removed
+        """
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        removed = db.session.execute(
+            delete(StkCallback).where(StkCallback.received_at <= cutoff)
+        ).rowcount
+        db.session.commit()
+        return removed
+
     @classmethod
     def find_by_mpesa_request(cls, mpesa_request_id):
         """
@@ -162,30 +326,67 @@ class TransactionService:
         return query.all()
 
     @classmethod
-    def timeout_stale_transactions(cls, hours=1):
+    def timeout_stale_transactions(cls, hours=1, chunk_size=1000):
         """
         Mark old pending transactions as timed out
         
+        Works through the backlog in set-based chunks: each chunk is one
+        UPDATE ... WHERE status = 'pending' (returning the affected rows
+        where the database supports it) and one commit, followed by one
+        grouped tip_status frame per creator. Balances and rollups only
+        track completed tips, so timing out a pending tip changes neither.
+        
         Args:
             hours: Number of hours after which to timeout (default 1)
+            chunk_size: Transactions timed out per statement
             
         Returns:
             int: Number of transactions timed out
         """
         cutoff = datetime.utcnow() - timedelta(hours=hours)
-        stale_transactions = Transaction.query.filter_by(status='pending')\
-            .filter(Transaction.created_at <= cutoff)\
-            .all()
-            
+        stale = (Transaction.status == Transaction.STATUS_PENDING, Transaction.created_at <= cutoff)
+        returning = db.session.get_bind().dialect.update_returning
+        
         count = 0
-        for transaction in stale_transactions:
+        while True:
             try:
-                cls.update_transaction_status(transaction.id, 'timeout')
-                count += 1
+                if returning:
+                    chunk = select(Transaction.id).where(*stale)\
+                        .order_by(Transaction.created_at).limit(chunk_size).scalar_subquery()
+                    stmt = update(Transaction).where(Transaction.id.in_(chunk), *stale)
+                else:
+                    # No UPDATE ... RETURNING (MySQL): pick the chunk first
+                    rows = db.session.query(Transaction.id, Transaction.creator_id).filter(*stale)\
+                        .order_by(Transaction.created_at).limit(chunk_size).all()
+                    stmt = update(Transaction).where(Transaction.id.in_([row.id for row in rows]), *stale)
+                    
+                stmt = stmt.values(status=Transaction.STATUS_TIMEOUT, updated_at=datetime.utcnow())\
+                    .execution_options(synchronize_session=False)
+                if returning:
+                    rows = db.session.execute(stmt.returning(Transaction.id, Transaction.creator_id)).all()
+                else:
+                    db.session.execute(stmt)
+                db.session.commit()
             except Exception as e:
-                logging.error(f"Error timing out transaction {transaction.id}: {str(e)}")
-                continue
+                db.session.rollback()
+                logging.error(f"Error timing out stale transactions: {str(e)}")
+                break
                 
+            if not rows:
+                break
+            count += len(rows)
+            
+            by_creator = {}
+            for row in rows:
+                by_creator.setdefault(row.creator_id, []).append(row.id)
+            for creator_id, transaction_ids in by_creator.items():
+                SocketManager.emit_tip_statuses(creator_id, transaction_ids, Transaction.STATUS_TIMEOUT)
+                
+            if len(rows) < chunk_size:
+                break
+                
+        if count:
+            logging.info(f"Timed out {count} stale pending transactions")
         return count
         
     @classmethod
@@ -211,6 +412,9 @@ class TransactionService:
         if not transaction:
             raise ValueError("Transaction is required")
             
+        old_status = transaction.status
+        if old_status == Transaction.STATUS_PENDING and not cls._claim_pending(transaction, 'completed'):
+            return transaction
         transaction.status = 'completed'
         transaction.updated_at = datetime.utcnow()
         
@@ -223,10 +427,12 @@ class TransactionService:
         if phone_number:
             transaction.phone_number = phone_number
             
+        # Credit the creator's balance and rollups in the same database transaction
+        cls._record_status_change(transaction, old_status)
         db.session.commit()
         
         # Emit socket events
-        cls._emit_transaction_events(transaction, 'pending')
+        cls._emit_transaction_events(transaction, old_status)
         
         logging.debug(f"Processed successful payment for transaction {transaction.id}")
         return transaction
@@ -246,6 +452,9 @@ class TransactionService:
         if not transaction:
             raise ValueError("Transaction is required")
             
+        old_status = transaction.status
+        if old_status == Transaction.STATUS_PENDING and not cls._claim_pending(transaction, 'failed'):
+            return transaction
         transaction.status = 'failed'
         transaction.updated_at = datetime.utcnow()
         
@@ -256,6 +465,7 @@ class TransactionService:
             else:
                 transaction.message += f" (Failed: {reason})"
             
+        cls._record_status_change(transaction, old_status)
         db.session.commit()
         
         # Emit status update event
@@ -268,6 +478,46 @@ class TransactionService:
         logging.debug(f"Processed failed payment for transaction {transaction.id}: {reason}")
         return transaction
         
+    @classmethod
+    def apply_status_query(cls, transaction, response):
+        """
+        Apply an M-Pesa STK query response to a pending transaction
+        
+        Args:
+            transaction: The pending transaction
+            response: Response from MpesaClient.query_transaction
+            
+        Returns:
+            str: The transaction status after applying the response
+        """
+        mpesa_result_code = response.get('ResultCode')
+        mpesa_result_desc = response.get('ResultDescription', '')
+
+        if mpesa_result_code == '0': # Transaction successful
+            logging.info(f"M-Pesa query confirms success for Tx ID {transaction.id}. Response: {response}")
+            # Receipt might be in response, double check M-Pesa docs for query response structure
+            queried_receipt = response.get('MpesaReceiptNumber') # Example field name
+            cls.process_successful_payment(
+                transaction,
+                receipt_number=queried_receipt or transaction.mpesa_receipt,
+                phone_number=transaction.phone_number
+            )
+            return Transaction.STATUS_COMPLETED
+
+        if mpesa_result_code: # Any non-zero M-Pesa code indicates failure/issue
+            logging.warning(f"M-Pesa query indicates failure/issue for Tx ID {transaction.id}. Code: {mpesa_result_code}, Desc: {mpesa_result_desc}")
+            # Decide if this maps to 'failed' or 'timeout' or remains 'pending'
+            # For now, map to failed
+            cls.process_failed_payment(
+                transaction,
+                reason=mpesa_result_desc
+            )
+            return Transaction.STATUS_FAILED
+
+        # M-Pesa query response format unexpected or indicates pending/unknown
+        logging.warning(f"Unexpected M-Pesa query response for Tx ID {transaction.id}: {response}")
+        return transaction.status
+
     @classmethod
     def get_recent_transactions(cls, creator_id, limit=10):
         """
@@ -285,6 +535,27 @@ class TransactionService:
             .limit(limit)\
             .all()
             
+    @classmethod
+    def get_transaction_page(cls, creator_id, limit=50, cursor=None):
+        """
+        Get one page of a creator's transactions, newest first
+        
+        Only the listing columns are loaded.
+        
+        Args:
+            creator_id: ID of the creator
+            limit: Maximum number of transactions to return
+            cursor: next_cursor from the previous page (optional)
+            
+        Returns:
+            tuple: (transactions, next_cursor)
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = Transaction.query.filter_by(creator_id=creator_id)
+        return keyset_page(query, Transaction, limit, cursor, columns=LISTING_COLUMNS)
+            
     @classmethod
     def get_transaction_stats(cls, creator_id):
         """
@@ -296,15 +567,28 @@ class TransactionService:
         Returns:
             dict: Dictionary with statistics
         """
-        transactions = Transaction.query.filter_by(creator_id=creator_id).all()
+        # One grouped aggregate served from idx_transaction_creator_status;
+        # no ORM rows are loaded
+        rows = db.session.query(
+                Transaction.status,
+                func.count(Transaction.id),
+                func.coalesce(func.sum(Transaction.amount), 0.0)
+            )\
+            .filter(Transaction.creator_id == creator_id)\
+            .group_by(Transaction.status)\
+            .all()
         
-        # Calculate statistics
-        completed_transactions = [t for t in transactions if t.status == 'completed']
-        total_amount = sum(t.amount for t in completed_transactions)
-        total_tips = len(completed_transactions)
+        total_transactions = 0
+        total_tips = 0
+        total_amount = 0.0
+        for status, count, amount in rows:
+            total_transactions += count
+            if status == Transaction.STATUS_COMPLETED:
+                total_tips = count
+                total_amount = amount
         
         return {
             'total_amount': total_amount,
             'total_tips': total_tips,
-            'total_transactions': len(transactions)
-        } 
\ No newline at end of file
+            'total_transactions': total_transactions
+        }
\ No newline at end of file
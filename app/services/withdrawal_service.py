@@ -1,36 +1,40 @@
-from datetime import datetime
-from sqlalchemy import func
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, update
 from .. import db
 from ..models.withdrawal import Withdrawal
-from ..models.transaction import Transaction
+from ..models.b2c_callback import ParkedB2CCallback
+from .balance_ledger import BalanceLedger
+from .db_utils import keyset_page
+import json
+import logging
+import uuid
+
+# Columns serialized by the withdrawal listing endpoints and table
+LISTING_COLUMNS = ('id', 'amount', 'status', 'mpesa_receipt', 'failure_reason', 'created_at', 'completed_at')
 
 class WithdrawalService:
     @staticmethod
     def get_available_balance(creator_id):
-        """Calculate available balance for withdrawal"""
-        # Get total tips
-        total_tips = db.session.query(func.sum(Transaction.amount))\
-            .filter(Transaction.creator_id == creator_id)\
-            .filter(Transaction.status == 'completed')\
-            .scalar() or 0.0
-            
-        # Get total withdrawals
-        total_withdrawals = db.session.query(func.sum(Withdrawal.amount))\
-            .filter(Withdrawal.creator_id == creator_id)\
-            .filter(Withdrawal.status.in_(['completed', 'pending']))\
-            .scalar() or 0.0
-            
-        return total_tips - total_withdrawals
+        """Get available balance for withdrawal from the balance ledger"""
+        return BalanceLedger.get(creator_id).available
     
     @staticmethod
     def create_withdrawal(creator_id, amount, phone_number):
-        """Create a new withdrawal request"""
-        available_balance = WithdrawalService.get_available_balance(creator_id)
+        """
+        Create a new withdrawal request
+        
+        The amount is reserved against the creator's balance in the same
+        database transaction that inserts the withdrawal.
         
+        Raises:
+            ValueError: If the amount is not positive or exceeds the balance
+        """
         if amount <= 0:
             raise ValueError("Withdrawal amount must be positive")
             
-        if amount > available_balance:
+        if not BalanceLedger.reserve_withdrawal(creator_id, amount):
+            db.session.rollback()
             raise ValueError("Insufficient balance")
             
         withdrawal = Withdrawal(
@@ -48,52 +52,288 @@ class WithdrawalService:
     @staticmethod
     def get_withdrawals(creator_id, limit=50):
         """Get recent withdrawals for a creator"""
-        return Withdrawal.query\
-            .filter_by(creator_id=creator_id)\
-            .order_by(Withdrawal.created_at.desc())\
-            .limit(limit)\
+        return WithdrawalService.get_withdrawal_page(creator_id, limit)[0]
+    
+    @staticmethod
+    def get_withdrawal_page(creator_id, limit=50, cursor=None):
+        """
+        Get one page of a creator's withdrawals, newest first
+        
+        Only the listing columns are loaded.
+        
+        Args:
+            creator_id: ID of the creator
+            limit: Maximum number of withdrawals to return
+            cursor: next_cursor from the previous page (optional)
+            
+        Returns:
+            tuple: (withdrawals, next_cursor)
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = Withdrawal.query.filter_by(creator_id=creator_id)
+        return keyset_page(query, Withdrawal, limit, cursor, columns=LISTING_COLUMNS)
+    
+    @staticmethod
+    def send_payout(withdrawal, retries=2):
+        """
+        Send the M-Pesa B2C payment for a pending withdrawal and record the outcome
+        
+        Network and API errors are raised to the caller so it can decide
+        whether to fail the withdrawal or retry later. The withdrawal's
+        OriginatorConversationID is generated and committed before the first
+        send and reused on every retry, so M-Pesa and the result callback
+        can tie all attempts to the one payout.
+        
+        Args:
+            withdrawal: The pending withdrawal
+            retries: Client-level retries of safe failures (0 under the job queue)
+        
+        Returns:
+            dict: Outcome with 'result' of completed, pending or failed
+        """
+        if not withdrawal.originator_conversation_id:
+            withdrawal.originator_conversation_id = str(uuid.uuid4())
+            db.session.commit()
+
+        response = current_app.mpesa.b2c_payment(
+            phone_number=withdrawal.phone_number,
+            amount=int(withdrawal.amount),
+            remarks=f"StreamTip withdrawal #{withdrawal.id}",
+            originator_conversation_id=withdrawal.originator_conversation_id,
+            retries=retries
+        )
+
+        logging.info(f"M-Pesa B2C response: {json.dumps(response, indent=2)}")
+
+        if response.get('test_mode', False):
+            # Handle test mode response
+            receipt = f'TEST-{withdrawal.id}'
+            WithdrawalService.process_withdrawal(
+                withdrawal.id,
+                success=True,
+                receipt=receipt,
+                test_mode=True
+            )
+            return {'result': 'completed', 'receipt': receipt}
+
+        if 'ConversationID' in response:
+            # Store the conversation ID for callback matching
+            WithdrawalService.stamp_conversation_id(withdrawal, response['ConversationID'])
+            return {'result': 'pending'}
+
+        # Invalid response from M-Pesa
+        WithdrawalService.process_withdrawal(
+            withdrawal.id,
+            success=False,
+            failure_reason='Invalid response from M-Pesa'
+        )
+        return {'result': 'failed'}
+    
+    @staticmethod
+    def stamp_conversation_id(withdrawal, conversation_id):
+        """
+        Record the M-Pesa ConversationID on a withdrawal and settle any
+        callback that arrived before it was stored
+        """
+        withdrawal.mpesa_request_id = conversation_id
+        db.session.commit()
+
+        try:
+            WithdrawalService.reconcile_parked_callbacks(conversation_id)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error reconciling parked callbacks for {conversation_id}: {str(e)}", exc_info=True)
+
+    @staticmethod
+    def handle_b2c_callback(conversation_id, kind, result):
+        """
+        Apply a B2C result or timeout callback, parking it if the withdrawal
+        has not been stamped with its ConversationID yet
+        
+        Args:
+            conversation_id: M-Pesa ConversationID
+            kind: ParkedB2CCallback.KIND_RESULT or KIND_TIMEOUT
+            result: The callback 'Result' body
+            
+        Returns:
+            str: 'processed' or 'parked'
+        """
+        withdrawal = Withdrawal.query.filter_by(mpesa_request_id=conversation_id).first()
+        if withdrawal:
+            WithdrawalService._apply_b2c_callback(withdrawal, kind, result)
+            return 'processed'
+
+        # The send may have timed out before we learned the ConversationID;
+        # our own OriginatorConversationID still identifies the payout
+        originator_id = result.get('OriginatorConversationID')
+        if originator_id:
+            withdrawal = Withdrawal.query.filter_by(originator_conversation_id=originator_id).first()
+            if withdrawal and not withdrawal.mpesa_request_id:
+                withdrawal.mpesa_request_id = conversation_id
+                db.session.commit()
+                WithdrawalService._apply_b2c_callback(withdrawal, kind, result)
+                return 'processed'
+
+        db.session.add(ParkedB2CCallback(
+            conversation_id=conversation_id,
+            kind=kind,
+            payload=json.dumps(result)
+        ))
+        db.session.commit()
+        logging.info(f"Parked B2C {kind} callback for conversation_id {conversation_id}")
+
+        # The stamp may have committed between our lookup and the park; whichever
+        # side commits last sees the other and settles the callback
+        if Withdrawal.query.filter_by(mpesa_request_id=conversation_id).first():
+            WithdrawalService.reconcile_parked_callbacks(conversation_id)
+            return 'processed'
+
+        return 'parked'
+
+    @staticmethod
+    def reconcile_parked_callbacks(conversation_id):
+        """
+        Apply parked callbacks for a stamped withdrawal
+        
+        Each parked row is claimed by deleting it, so a callback is applied
+        exactly once even if both the stamper and the callback handler race here.
+        
+        Returns:
+            int: Number of callbacks applied
+        """
+        withdrawal = Withdrawal.query.filter_by(mpesa_request_id=conversation_id).first()
+        if not withdrawal:
+            return 0
+
+        parked = ParkedB2CCallback.query.filter_by(conversation_id=conversation_id)\
+            .order_by(ParkedB2CCallback.id)\
             .all()
+
+        applied = 0
+        for callback in parked:
+            claimed = db.session.execute(
+                delete(ParkedB2CCallback).where(ParkedB2CCallback.id == callback.id)
+            ).rowcount
+            if claimed != 1:
+                db.session.rollback()
+                continue
+
+            try:
+                WithdrawalService._apply_b2c_callback(withdrawal, callback.kind, callback.result)
+            except ValueError as e:
+                # Duplicate callback for a settled withdrawal; drop it
+                db.session.commit()
+                logging.warning(f"Discarded parked B2C {callback.kind} callback for withdrawal {withdrawal.id}: {str(e)}")
+                continue
+
+            applied += 1
+            logging.info(f"Applied parked B2C {callback.kind} callback to withdrawal {withdrawal.id}")
+
+        return applied
+
+    @staticmethod
+    def _apply_b2c_callback(withdrawal, kind, result):
+        """Complete or fail a withdrawal from a B2C callback body"""
+        if kind == ParkedB2CCallback.KIND_TIMEOUT:
+            WithdrawalService.process_withdrawal(
+                withdrawal.id,
+                success=False,
+                failure_reason='Transaction timed out'
+            )
+            logging.info(f"Marked withdrawal {withdrawal.id} as failed due to timeout")
+            return
+
+        result_code = result.get('ResultCode')
+        if result_code == 0:  # Success
+            # Extract transaction receipt
+            receipt = None
+            params = result.get('ResultParameters', {}).get('ResultParameter', [])
+            for param in params:
+                if param.get('Key') == 'TransactionReceipt':
+                    receipt = param.get('Value')
+                    break
+
+            WithdrawalService.process_withdrawal(
+                withdrawal.id,
+                success=True,
+                receipt=receipt
+            )
+            logging.info(f"Successfully processed withdrawal {withdrawal.id}")
+        else:
+            result_desc = result.get('ResultDesc')
+            WithdrawalService.process_withdrawal(
+                withdrawal.id,
+                success=False,
+                failure_reason=result_desc or 'Payment failed'
+            )
+            logging.error(f"Failed to process withdrawal {withdrawal.id}: {result_desc}")
+
+    @staticmethod
+    def prune_parked_callbacks(hours=24):
+        """
+        Drop parked callbacks that never matched a withdrawal
+        
+        Returns:
+            int: Number of callbacks removed
+        """
+        cutoff = datetime.utcnow() - timedelta(hours=hours)
+        removed = db.session.execute(
+            delete(ParkedB2CCallback).where(ParkedB2CCallback.created_at <= cutoff)
+        ).rowcount
+        db.session.commit()
+        return removed
     
     @staticmethod
     def process_withdrawal(withdrawal_id, success=True, receipt=None, failure_reason=None, test_mode=False):
-        """Process a withdrawal completion or failure"""
+        """
+        Process a withdrawal completion or failure
+
+        The status moves out of pending in one conditional UPDATE, so when
+        a result and a timeout callback race only the caller whose UPDATE
+        matched the pending row moves the amount between ledger columns.
+        """
         withdrawal = Withdrawal.query.get(withdrawal_id)
         if not withdrawal:
             raise ValueError("Withdrawal not found")
-            
-        if withdrawal.status != 'pending':
-            if test_mode:
-                # Allow reprocessing in test mode
-                pass
-            else:
+
+        status = 'completed' if success else 'failed'
+        claimed = db.session.execute(
+            update(Withdrawal)
+            .where(Withdrawal.id == withdrawal.id, Withdrawal.status == 'pending')
+            .values(status=status)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+
+        if not claimed:
+            db.session.commit()
+            db.session.refresh(withdrawal)
+            if not test_mode:
                 raise ValueError("Withdrawal already processed")
-            
+            # Test mode tolerates repeats but keeps the first outcome, which the ledger reflects
+            logging.info(f"Test mode: withdrawal {withdrawal.id} already {withdrawal.status}, leaving it unchanged")
+            return withdrawal
+
+        withdrawal.status = status
         if success:
-            withdrawal.status = 'completed'
             withdrawal.mpesa_receipt = receipt or (f'TEST-{withdrawal.id}' if test_mode else None)
             withdrawal.completed_at = datetime.utcnow()
         else:
-            withdrawal.status = 'failed'
             withdrawal.failure_reason = failure_reason
-            
+
+        # Move the amount between ledger columns in the same database transaction
+        BalanceLedger.record_withdrawal_status(withdrawal, 'pending')
         db.session.commit()
         return withdrawal
     
     @staticmethod
     def get_withdrawal_stats(creator_id):
         """Get withdrawal statistics for a creator"""
-        total_withdrawn = db.session.query(func.sum(Withdrawal.amount))\
-            .filter(Withdrawal.creator_id == creator_id)\
-            .filter(Withdrawal.status == 'completed')\
-            .scalar() or 0.0
-            
-        pending_withdrawals = db.session.query(func.sum(Withdrawal.amount))\
-            .filter(Withdrawal.creator_id == creator_id)\
-            .filter(Withdrawal.status == 'pending')\
-            .scalar() or 0.0
+        balance = BalanceLedger.get(creator_id)
             
         return {
-            'total_withdrawn': total_withdrawn,
-            'pending_withdrawals': pending_withdrawals,
-            'available_balance': WithdrawalService.get_available_balance(creator_id)
-        } 
\ No newline at end of file
+            'total_withdrawn': balance.withdrawn,
+            'pending_withdrawals': balance.pending_withdrawals,
+            'available_balance': balance.available
+        }
\ No newline at end of file
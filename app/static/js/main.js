@@ -170,6 +170,10 @@ function connectWebSocket() {
         // Update transaction status in table
         updateTransactionStatus(data.transaction_id, data.status);
     });
+    
+    socket.on('tips_batch', function(batch) {
+        dispatchTipsBatch(socket, batch);
+    });
 }
 
 /**
@@ -0,0 +1,14 @@
+/**
+ * Replay a tips_batch frame through the socket's own event handlers
+ *
+ * The server coalesces bursts of new_tip/tip_status events into one
+ * tips_batch frame; each item is handed to whatever listeners the page
+ * registered for its event, in order.
+ */
+function dispatchTipsBatch(socket, batch) {
+    batch.events.forEach(function(item) {
+        socket.listeners(item.event).forEach(function(handler) {
+            handler(item.data);
+        });
+    });
+}
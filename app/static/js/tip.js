@@ -58,18 +58,19 @@ const socket = io({
 
 let socketConnected = false;
 let currentTransactionId = null;
+let currentStatusToken = null;
+
+// Status updates for our own tip only; the token comes from initiate_tip
+function watchTransaction() {
+    if (socketConnected && currentTransactionId && currentStatusToken) {
+        socket.emit('join', { transaction_id: currentTransactionId, token: currentStatusToken });
+    }
+}
 
 socket.on('connect', () => {
     console.log('Socket connected');
     socketConnected = true;
-    // Join creator's room
-    const creatorId = document.getElementById('creatorId')?.value;
-    if (creatorId) {
-        console.log('Joining creator room:', creatorId);
-        socket.emit('join', { creator_id: creatorId });
-    } else {
-        console.error('No creator ID found');
-    }
+    watchTransaction();
 });
 
 socket.on('disconnect', () => {
@@ -199,7 +200,9 @@ async function handleFormSubmit(event) {
 
         if (response.ok && data.status === 'success') {
             currentTransactionId = data.transaction_id;
+            currentStatusToken = data.status_token || null;
             console.log('Transaction ID set:', currentTransactionId);
+            watchTransaction();
 
             if (data.test_mode) {
                 console.log('Test mode response received');
@@ -415,29 +418,7 @@ Thank you for using M-PESA
     }
 });
 
-// Handle new_tip event for immediate confirmation
-socket.on('new_tip', (data) => {
-    console.log('Socket: New tip received:', data);
-    // If we have a current transaction and receive a new_tip event,
-    // treat it as a successful completion
-    if (currentTransactionId) {
-        const receipt = `
-M-PESA
-Transaction ID: ${data.mpesa_receipt}
-Amount: KES ${data.amount}
-Phone: ${data.phone_number || 'XXXXXXXXX'}
-Time: ${data.timestamp}
-Paid to: StreamTip Creator
-Status: Completed
-
-Thank you for using M-PESA
-        `.trim();
-        displayMessage('success', receipt);
-        showLoading(false);
-        resetForm();
-        currentTransactionId = null;
-    }
-});
+socket.on('tips_batch', (batch) => dispatchTipsBatch(socket, batch));
 
 // --- Initialization ---
 
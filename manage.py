@@ -10,6 +10,11 @@ from werkzeug.security import generate_password_hash
 
 from app import create_app, db
 from app.models import Creator, Transaction, Withdrawal, TipLink
+from app.services.job_queue import JobQueue
+from app.services.status_reconciler import StatusReconciler
+from app.services.balance_ledger import BalanceLedger
+from app.services.rollup_service import RollupService
+from app.services.scheduler import Scheduler
 
 app = create_app()
 
@@ -72,5 +77,85 @@ def list_creators():
         for creator in creators:
             click.echo(f'ID: {creator.id}, Username: {creator.username}, Display Name: {creator.display_name}, Active: {creator.active}')
 
+@cli.command()
+@click.option('--batch-size', default=10, help='Jobs claimed per poll')
+@click.option('--poll-interval', default=1.0, help='Seconds to wait when the queue is empty')
+@click.option('--visibility-timeout', default=300, help='Seconds before an unfinished job is retried elsewhere')
+@click.option('--once', is_flag=True, help='Process ready jobs once and exit')
+@click.option('--with-scheduler', is_flag=True, help='Also run periodic maintenance tasks in this process')
+def run_worker(batch_size, poll_interval, visibility_timeout, once, with_scheduler):
+    """Run the outbound M-Pesa job worker."""
+    if with_scheduler and not once:
+        Scheduler.start_background(app)
+    processed = JobQueue.run_worker(
+        app,
+        batch_size=batch_size,
+        poll_interval=poll_interval,
+        visibility_timeout=visibility_timeout,
+        once=once
+    )
+    click.echo(f'Processed {processed} jobs.')
+
+@cli.command()
+@click.argument('job_id', type=int)
+def requeue_job(job_id):
+    """Move a dead-lettered job back onto the queue."""
+    with app.app_context():
+        job = JobQueue.requeue(job_id)
+        click.echo(f'Requeued {job.kind} job {job.id}.')
+
+@cli.command()
+@click.option('--interval', default=10, help='Seconds between sweeps')
+@click.option('--once', is_flag=True, help='Run a single sweep and exit')
+def reconcile_payments(interval, once):
+    """Settle pending STK pushes by querying M-Pesa."""
+    stats = StatusReconciler.run(app, interval=interval, once=once)
+    if stats:
+        click.echo(f'Reconciled: {stats}')
+
+@cli.command()
+@click.option('--creator-id', default=None, type=int, help='Only rebuild this creator')
+def rebuild_balances(creator_id):
+    """Rebuild the creator balance ledger from tips and withdrawals."""
+    with app.app_context():
+        balances = BalanceLedger.rebuild(creator_id)
+        click.echo(f'Rebuilt {len(balances)} creator balances.')
+
+@cli.command()
+def verify_balances():
+    """Check the creator balance ledger against tips and withdrawals."""
+    with app.app_context():
+        mismatches = BalanceLedger.verify()
+        if not mismatches:
+            click.echo('All creator balances match.')
+            return
+            
+        for creator_id, column, actual, expected in mismatches:
+            click.echo(f'Creator {creator_id}: {column} is {actual}, expected {expected}')
+        sys.exit(1)
+
+@cli.command()
+@click.option('--creator-id', default=None, type=int, help='Only backfill this creator')
+@click.option('--batch-size', default=10000, help='Transactions fetched per round trip')
+def backfill_rollups(creator_id, batch_size):
+    """Rebuild hourly and daily tip rollups from completed tips."""
+    with app.app_context():
+        buckets = RollupService.backfill(creator_id, batch_size=batch_size)
+        click.echo(f'Wrote {buckets} tip rollup buckets.')
+
+@cli.command()
+@click.option('--task', 'tasks', multiple=True, help='Only run this task (repeatable)')
+@click.option('--tick', default=1.0, help='Seconds between checks for due tasks')
+@click.option('--jitter', default=0.1, help='Fraction of each interval added at random')
+@click.option('--once', is_flag=True, help='Run each due task once and exit')
+def run_scheduler(tasks, tick, jitter, once):
+    """Run periodic maintenance tasks (stale sweeps, reconciliation, pruning)."""
+    unknown = set(tasks) - set(Scheduler._tasks)
+    if unknown:
+        raise click.BadParameter(f"Unknown task(s): {', '.join(sorted(unknown))}. "
+                                 f"Available: {', '.join(Scheduler._tasks)}")
+    runs = Scheduler.run(app, tick=tick, jitter=jitter, names=tasks or None, once=once)
+    click.echo(f'Ran {runs} tasks.')
+
 if __name__ == '__main__':
     cli() 
\ No newline at end of file
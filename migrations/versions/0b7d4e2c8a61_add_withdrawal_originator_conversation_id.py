@@ -0,0 +1,28 @@
+"""Add originator_conversation_id to withdrawal for idempotent B2C retries
+
+Revision ID: 0b7d4e2c8a61
+Revises: 5f2b8d4a7c39
+Create Date: 2026-10-17 21:14:37.502113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7d4e2c8a61'
+down_revision = '5f2b8d4a7c39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('withdrawal', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('originator_conversation_id', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_withdrawal_originator_conversation_id', ['originator_conversation_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('withdrawal', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_withdrawal_originator_conversation_id', type_='unique')
+        batch_op.drop_column('originator_conversation_id')
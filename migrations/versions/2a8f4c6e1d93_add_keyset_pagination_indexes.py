@@ -0,0 +1,32 @@
+"""Add creator/created_at indexes for keyset pagination
+
+Revision ID: 2a8f4c6e1d93
+Revises: 9b3e6d2f7c15
+Create Date: 2026-10-17 13:41:07.208815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a8f4c6e1d93'
+down_revision = '9b3e6d2f7c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.create_index('idx_transaction_creator_created', ['creator_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('withdrawal', schema=None) as batch_op:
+        batch_op.create_index('idx_withdrawal_creator_created', ['creator_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('withdrawal', schema=None) as batch_op:
+        batch_op.drop_index('idx_withdrawal_creator_created')
+
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('idx_transaction_creator_created')
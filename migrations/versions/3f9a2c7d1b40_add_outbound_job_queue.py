@@ -0,0 +1,46 @@
+"""Add outbound_job table for queued M-Pesa calls
+
+Revision ID: 3f9a2c7d1b40
+Revises: c1175b755420
+Create Date: 2026-10-17 09:12:44.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a2c7d1b40'
+down_revision = 'c1175b755420'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbound_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_by', sa.String(length=64), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.String(length=500), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('outbound_job', schema=None) as batch_op:
+        batch_op.create_index('idx_outbound_job_ready', ['status', 'available_at'], unique=False)
+        batch_op.create_index('idx_outbound_job_kind', ['kind'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('outbound_job', schema=None) as batch_op:
+        batch_op.drop_index('idx_outbound_job_kind')
+        batch_op.drop_index('idx_outbound_job_ready')
+
+    op.drop_table('outbound_job')
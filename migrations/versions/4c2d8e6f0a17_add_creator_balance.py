@@ -0,0 +1,46 @@
+"""Add creator_balance ledger table
+
+Revision ID: 4c2d8e6f0a17
+Revises: b7e3c91f5a28
+Create Date: 2026-10-17 11:26:53.804417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c2d8e6f0a17'
+down_revision = 'b7e3c91f5a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('creator_balance',
+        sa.Column('creator_id', sa.Integer(), nullable=False),
+        sa.Column('completed_tips', sa.Float(), nullable=False),
+        sa.Column('pending_withdrawals', sa.Float(), nullable=False),
+        sa.Column('withdrawn', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['creator_id'], ['creator.id'], ),
+        sa.PrimaryKeyConstraint('creator_id')
+    )
+
+    # Backfill from existing tips and withdrawals
+    op.execute("""
+        INSERT INTO creator_balance (creator_id, completed_tips, pending_withdrawals, withdrawn, updated_at)
+        SELECT c.id,
+            COALESCE((SELECT SUM(t.amount) FROM transactions t
+                      WHERE t.creator_id = c.id AND t.status = 'completed'), 0),
+            COALESCE((SELECT SUM(w.amount) FROM withdrawal w
+                      WHERE w.creator_id = c.id AND w.status = 'pending'), 0),
+            COALESCE((SELECT SUM(w.amount) FROM withdrawal w
+                      WHERE w.creator_id = c.id AND w.status = 'completed'), 0),
+            CURRENT_TIMESTAMP
+        FROM creator c
+    """)
+
+
+def downgrade():
+    op.drop_table('creator_balance')
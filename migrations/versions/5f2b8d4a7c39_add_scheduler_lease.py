@@ -0,0 +1,32 @@
+"""Add scheduler_lease table for periodic task leader election
+
+Revision ID: 5f2b8d4a7c39
+Revises: 7a5c3e9d1f24
+Create Date: 2026-10-17 19:02:54.381906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2b8d4a7c39'
+down_revision = '7a5c3e9d1f24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('scheduler_lease',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('locked_by', sa.String(length=64), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=False),
+        sa.Column('last_started_at', sa.DateTime(), nullable=True),
+        sa.Column('last_finished_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.String(length=500), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('scheduler_lease')
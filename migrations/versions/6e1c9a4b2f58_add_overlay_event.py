@@ -0,0 +1,37 @@
+"""Add overlay_event table for replayable creator event streams
+
+Revision ID: 6e1c9a4b2f58
+Revises: 2a8f4c6e1d93
+Create Date: 2026-10-17 15:32:18.644021
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e1c9a4b2f58'
+down_revision = '2a8f4c6e1d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('overlay_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('creator_id', sa.Integer(), nullable=False),
+        sa.Column('event', sa.String(length=32), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['creator_id'], ['creator.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('overlay_event', schema=None) as batch_op:
+        batch_op.create_index('idx_overlay_event_creator', ['creator_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('overlay_event', schema=None) as batch_op:
+        batch_op.drop_index('idx_overlay_event_creator')
+
+    op.drop_table('overlay_event')
@@ -0,0 +1,26 @@
+"""Add status/created_at index for the stale pending transaction sweep
+
+Revision ID: 7a5c3e9d1f24
+Revises: d3f8b2a6c4e1
+Create Date: 2026-10-17 18:12:36.517240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a5c3e9d1f24'
+down_revision = 'd3f8b2a6c4e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.create_index('idx_transaction_status_created', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('idx_transaction_status_created')
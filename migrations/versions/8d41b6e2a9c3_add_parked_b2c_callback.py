@@ -0,0 +1,38 @@
+"""Add parked_b2c_callback table for early B2C callbacks
+
+Revision ID: 8d41b6e2a9c3
+Revises: 3f9a2c7d1b40
+Create Date: 2026-10-17 10:03:27.552190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41b6e2a9c3'
+down_revision = '3f9a2c7d1b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('parked_b2c_callback',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('conversation_id', sa.String(length=50), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('parked_b2c_callback', schema=None) as batch_op:
+        batch_op.create_index('idx_parked_b2c_conversation', ['conversation_id'], unique=False)
+        batch_op.create_index('idx_parked_b2c_created', ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('parked_b2c_callback', schema=None) as batch_op:
+        batch_op.drop_index('idx_parked_b2c_created')
+        batch_op.drop_index('idx_parked_b2c_conversation')
+
+    op.drop_table('parked_b2c_callback')
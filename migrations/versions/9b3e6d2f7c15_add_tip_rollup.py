@@ -0,0 +1,34 @@
+"""Add tip_rollup table
+
+Revision ID: 9b3e6d2f7c15
+Revises: e5a17f3b9d62
+Create Date: 2026-10-17 13:02:41.519304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e6d2f7c15'
+down_revision = 'e5a17f3b9d62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bucket truncation is dialect specific, so existing tips are backfilled
+    # with `python manage.py backfill-rollups` after upgrading
+    op.create_table('tip_rollup',
+        sa.Column('creator_id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=10), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('tip_count', sa.Integer(), nullable=False),
+        sa.Column('tip_amount', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['creator_id'], ['creator.id'], ),
+        sa.PrimaryKeyConstraint('creator_id', 'granularity', 'bucket_start')
+    )
+
+
+def downgrade():
+    op.drop_table('tip_rollup')
@@ -0,0 +1,26 @@
+"""Add status_checked_at to transactions for the status reconciler
+
+Revision ID: b7e3c91f5a28
+Revises: 8d41b6e2a9c3
+Create Date: 2026-10-17 10:41:09.120734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3c91f5a28'
+down_revision = '8d41b6e2a9c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status_checked_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_column('status_checked_at')
@@ -0,0 +1,31 @@
+"""Add stk_callback inbox for idempotent STK push callbacks
+
+Revision ID: d3f8b2a6c4e1
+Revises: 6e1c9a4b2f58
+Create Date: 2026-10-17 17:05:41.203518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f8b2a6c4e1'
+down_revision = '6e1c9a4b2f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stk_callback',
+        sa.Column('checkout_request_id', sa.String(length=50), nullable=False),
+        sa.Column('result_code', sa.Integer(), nullable=True),
+        sa.Column('result_desc', sa.String(length=255), nullable=True),
+        sa.Column('mpesa_receipt', sa.String(length=50), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('checkout_request_id')
+    )
+
+
+def downgrade():
+    op.drop_table('stk_callback')
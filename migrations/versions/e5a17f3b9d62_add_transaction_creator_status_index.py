@@ -0,0 +1,26 @@
+"""Add composite creator/status index on transactions
+
+Revision ID: e5a17f3b9d62
+Revises: 4c2d8e6f0a17
+Create Date: 2026-10-17 11:58:30.441962
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a17f3b9d62'
+down_revision = '4c2d8e6f0a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.create_index('idx_transaction_creator_status', ['creator_id', 'status', 'amount'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('idx_transaction_creator_status')
@@ -0,0 +1,104 @@
+"""Benchmark concurrent SQLite writes with the default and the tuned engine setup.
+
+Writer threads record callback-style writes (insert a tip, bump the
+creator's ledger row, commit) while reader threads run the dashboard
+balance query. Each setup runs against a fresh database file and reports
+commits per second and how many writes failed with "database is locked".
+
+Usage: python scripts/bench_sqlite_writes.py [--writers 16] [--readers 8] [--seconds 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.database import engine_options, init_engine
+from app.models import Creator, CreatorBalance, Transaction
+
+def make_app(path, tuned):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    if tuned:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    db.init_app(app)
+    if tuned:
+        init_engine(app, db)
+    return app
+
+def run(app, writers, readers, seconds):
+    with app.app_context():
+        db.create_all()
+        creator = Creator(username='bench', password_hash='x')
+        db.session.add(creator)
+        db.session.commit()
+        creator_id = creator.id
+        db.session.add(CreatorBalance(creator_id=creator_id))
+        db.session.commit()
+
+    counts = {'commits': 0, 'locked': 0, 'reads': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def write():
+        with app.app_context():
+            while time.monotonic() < deadline:
+                try:
+                    db.session.add(Transaction(creator_id=creator_id, amount=10.0, status='completed',
+                                               created_at=datetime.utcnow()))
+                    db.session.execute(
+                        update(CreatorBalance)
+                        .where(CreatorBalance.creator_id == creator_id)
+                        .values(completed_tips=CreatorBalance.completed_tips + 10.0)
+                    )
+                    db.session.commit()
+                    outcome = 'commits'
+                except OperationalError:
+                    db.session.rollback()
+                    outcome = 'locked'
+                with lock:
+                    counts[outcome] += 1
+
+    def read():
+        with app.app_context():
+            while time.monotonic() < deadline:
+                try:
+                    Creator.compute_balance(creator_id)
+                    db.session.rollback()
+                    with lock:
+                        counts['reads'] += 1
+                except OperationalError:
+                    db.session.rollback()
+
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    threads += [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'setup':>8} {'writes/s':>10} {'reads/s':>10} {'locked':>8}")
+    for name, tuned in (('default', False), ('tuned', True)):
+        path = os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+        counts = run(make_app(path, tuned), args.writers, args.readers, args.seconds)
+        print(f"{name:>8} {counts['commits'] / args.seconds:10.1f} "
+              f"{counts['reads'] / args.seconds:10.1f} {counts['locked']:8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark TransactionService.get_transaction_stats as a creator's tip count grows.
+
+Compares the grouped aggregate against the previous approach of loading
+every Transaction row and summing in Python.
+
+Usage: python scripts/bench_transaction_stats.py [--sizes 1000,10000,100000,1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from app import db
+from app.models import Creator, Transaction
+from app.services.transaction_service import TransactionService
+
+STATUSES = ['completed'] * 8 + ['pending', 'failed']
+
+def orm_stats(creator_id):
+    """The previous implementation: hydrate every row and sum in Python"""
+    transactions = Transaction.query.filter_by(creator_id=creator_id).all()
+    completed = [t for t in transactions if t.status == 'completed']
+    return {
+        'total_amount': sum(t.amount for t in completed),
+        'total_tips': len(completed),
+        'total_transactions': len(transactions)
+    }
+
+def timed(func, *args, repeat=5):
+    """Best wall-clock time over several runs, in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        func(*args)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--skip-orm-above', type=int, default=100000,
+                        help='Skip the ORM baseline for larger sizes (it is slow)')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+
+        # A neighbour creator so the index has to discriminate
+        other = Creator(username='other', password_hash='x')
+        creator = Creator(username='bench', password_hash='x')
+        db.session.add_all([other, creator])
+        db.session.commit()
+        creator_id, other_id = creator.id, other.id
+
+        print(f"{'tips':>10} {'aggregate ms':>14} {'orm ms':>10}")
+        inserted = 0
+        for size in sizes:
+            rows = [{
+                'creator_id': creator_id if i % 2 else other_id,
+                'amount': float(random.randint(10, 5000)),
+                'status': random.choice(STATUSES),
+                'created_at': datetime.utcnow()
+            } for i in range(2 * (size - inserted))]
+            db.session.execute(Transaction.__table__.insert(), rows)
+            db.session.commit()
+            inserted = size
+
+            aggregate_ms = timed(TransactionService.get_transaction_stats, creator_id)
+            if size <= args.skip_orm_above:
+                orm_ms = f"{timed(orm_stats, creator_id, repeat=2):10.1f}"
+            else:
+                orm_ms = f"{'-':>10}"
+            print(f"{size:>10} {aggregate_ms:14.2f} {orm_ms}")
+
+if __name__ == '__main__':
+    main()
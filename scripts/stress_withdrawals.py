@@ -0,0 +1,100 @@
+"""Fire concurrent withdrawals at one creator and check the balance never overdraws.
+
+Each worker thread calls WithdrawalService.create_withdrawal against a
+creator funded with a known balance. With the conditional reservation
+exactly floor(balance / amount) withdrawals may succeed, no matter how
+many requests race.
+
+Usage: python scripts/stress_withdrawals.py [--requests 500] [--workers 64]
+       [--balance 10000] [--amount 70] [--database-url sqlite:////tmp/stress.sqlite]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from app import db
+from app.models import Creator, Transaction, Withdrawal
+from app.services.balance_ledger import BalanceLedger
+from app.services.withdrawal_service import WithdrawalService
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--balance', type=float, default=10000)
+    parser.add_argument('--amount', type=float, default=70)
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stress.sqlite')}"
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': args.workers, 'max_overflow': 0}
+    if database_url.startswith('sqlite'):
+        # Writers queue on SQLite's database lock instead of failing
+        app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = {'timeout': 60}
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        creator = Creator(username=f'stress{int(time.time())}', password_hash='x')
+        db.session.add(creator)
+        db.session.commit()
+        creator_id = creator.id
+
+        db.session.add(Transaction(creator_id=creator_id, amount=args.balance, phone_number='254700000000',
+                                   status='completed', created_at=datetime.utcnow()))
+        db.session.commit()
+        BalanceLedger.rebuild(creator_id)
+
+    start = threading.Barrier(min(args.workers, args.requests))
+    results = {'ok': 0, 'insufficient': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def withdraw(i):
+        if i < start.parties:
+            start.wait()  # Release the first wave together
+        with app.app_context():
+            try:
+                WithdrawalService.create_withdrawal(creator_id, args.amount, '254700000000')
+                outcome = 'ok'
+            except ValueError:
+                outcome = 'insufficient'
+            except Exception as e:
+                db.session.rollback()
+                print(f"request {i}: {e}", file=sys.stderr)
+                outcome = 'errors'
+        with lock:
+            results[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(withdraw, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        reserved = db.session.query(db.func.sum(Withdrawal.amount))\
+            .filter(Withdrawal.creator_id == creator_id).scalar() or 0.0
+        balance = BalanceLedger.get(creator_id)
+        mismatches = [m for m in BalanceLedger.verify() if m[0] == creator_id]
+
+    expected = min(int(args.balance // args.amount), args.requests)
+    print(f"{args.requests} requests, {args.workers} workers in {elapsed:.2f}s")
+    print(f"succeeded={results['ok']} insufficient={results['insufficient']} errors={results['errors']}")
+    print(f"reserved={reserved:.2f} of {args.balance:.2f}, ledger available={balance.available:.2f}")
+
+    ok = reserved <= args.balance and results['ok'] == expected and not mismatches
+    if not ok:
+        print(f"FAILED: expected {expected} withdrawals, ledger mismatches: {mismatches}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()